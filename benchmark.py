@@ -0,0 +1,318 @@
+## Benchmark de la conversión de Excel a HTML
+##
+## Genera libros .xlsx sintéticos con la forma de los libros de dominio (títulos, tablas con
+## encabezados agrupados, subencabezado, celdas combinadas y porcentajes) y mide por separado
+## excel_a_html_multiple, generar_html_hoja, procesar_tabla y las transformaciones de formato.py.
+## Cada etapa se ejecuta en un proceso nuevo para que el pico de memoria (RSS) sea solo suyo.
+##
+## Uso:
+##   python benchmark.py --filas 20000 --columnas 12 --salida bench.json
+##   python benchmark.py --filas 20000 --comparar bench.json
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.cell_range import CellRange
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ETAPAS = ['excel_a_html_multiple', 'generar_html_hoja', 'procesar_tabla', 'formato_lxml', 'formato_bs4']
+
+def generar_libro_sintetico(ruta, filas=5000, columnas=12, hojas=4, tablas_por_hoja=2, titulos_por_tabla=1,
+                            densidad_combinadas=0.05, proporcion_porcentajes=0.1, semilla=0):
+    """
+    Genera un libro .xlsx sintético y devuelve sus estadísticas.
+    filas es el total de filas de cuerpo de tabla del libro, repartidas entre hojas y tablas.
+    Cada tabla lleva titulos_por_tabla filas de título, un encabezado con grupos combinados
+    y un subencabezado con algunas columnas '(Fuente Oficial)'. densidad_combinadas es la
+    probabilidad de que una celda del cuerpo empiece un rango combinado de 2 celdas y
+    proporcion_porcentajes la de que una celda sea un número con formato de porcentaje.
+    Como en los libros reales, la primera hoja es un índice que no se convierte.
+    """
+    azar = random.Random(semilla)
+    wb = Workbook(write_only=True)
+    indice = wb.create_sheet("Índice")
+    indice.append(["INDICE"])
+
+    columnas = max(columnas, 2)
+    tablas_totales = max(hojas * tablas_por_hoja, 1)
+    estadisticas = {'hojas': hojas, 'tablas': 0, 'filas': 0, 'celdas': 0, 'combinadas': 0, 'porcentajes': 0}
+    for numero_hoja in range(1, hojas + 1):
+        ws = wb.create_sheet(f"Dominio {numero_hoja}")
+        filas_hoja = [[f"Dominio {numero_hoja}"], []]
+        combinadas = []
+        for numero_tabla in range(1, tablas_por_hoja + 1):
+            for numero_titulo in range(titulos_por_tabla):
+                filas_hoja.append([f"SECCIÓN {numero_tabla}.{numero_titulo} DEL DOMINIO {numero_hoja}"])
+
+            # Encabezado con grupos de 1 a 3 columnas combinadas
+            inicio = len(filas_hoja) + 1
+            encabezado = [None] * columnas
+            col_idx = 0
+            while col_idx < columnas:
+                ancho = min(azar.randint(1, 3), columnas - col_idx)
+                encabezado[col_idx] = f"Grupo {col_idx + 1}"
+                if ancho > 1:
+                    combinadas.append(CellRange(min_col=col_idx + 1, min_row=inicio,
+                                                max_col=col_idx + ancho, max_row=inicio))
+                col_idx += ancho
+            filas_hoja.append(encabezado)
+            filas_hoja.append([
+                f"Campo {col_idx + 1} (Fuente Oficial)" if col_idx % 4 == 3 else f"Campo {col_idx + 1}"
+                for col_idx in range(columnas)
+            ])
+
+            # Cuerpo de la tabla
+            n_filas = filas // tablas_totales + (1 if estadisticas['tablas'] < filas % tablas_totales else 0)
+            primera = len(filas_hoja) + 1
+            cuerpo = []
+            for k in range(n_filas):
+                fila = [f"COD{k:06d}", f"Elemento {k}"]
+                for col_idx in range(2, columnas):
+                    if azar.random() < proporcion_porcentajes:
+                        celda = WriteOnlyCell(ws, value=round(azar.random(), 4))
+                        celda.number_format = '0.00%'
+                        fila.append(celda)
+                        estadisticas['porcentajes'] += 1
+                    else:
+                        fila.append(azar.choice([None, f"texto {k}-{col_idx}", azar.randint(0, 10000), " valor "]))
+                cuerpo.append(fila)
+
+            # Rangos combinados de 2 celdas, horizontales o verticales, sin solaparse
+            ocupadas = set()
+            for k in range(n_filas):
+                for col_idx in range(2, columnas):
+                    if (k, col_idx) in ocupadas or azar.random() >= densidad_combinadas:
+                        continue
+                    if azar.random() < 0.5 and col_idx + 1 < columnas and (k, col_idx + 1) not in ocupadas:
+                        otra = (k, col_idx + 1)
+                    elif k + 1 < n_filas:
+                        otra = (k + 1, col_idx)
+                    else:
+                        continue
+                    ocupadas.update([(k, col_idx), otra])
+                    cuerpo[otra[0]][otra[1]] = None
+                    combinadas.append(CellRange(min_col=col_idx + 1, min_row=primera + k,
+                                                max_col=otra[1] + 1, max_row=primera + otra[0]))
+            filas_hoja.extend(cuerpo)
+            filas_hoja.append([])
+            estadisticas['tablas'] += 1
+
+        for fila in filas_hoja:
+            ws.append(fila)
+        for rango in combinadas:
+            ws.merged_cells.add(rango)
+        estadisticas['filas'] += len(filas_hoja)
+        estadisticas['celdas'] += len(filas_hoja) * columnas
+        estadisticas['combinadas'] += len(combinadas)
+    wb.save(ruta)
+    return estadisticas
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso actual en MB, o None si no se puede medir."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _cronometrar(funcion, repeticiones, preparar=None):
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def _hojas_convertidas(wb):
+    import converthtml
+    return [ws for ws in wb.worksheets if converthtml.hoja_seleccionada(ws.title, excluir=converthtml.HOJAS_EXCLUIDAS)]
+
+def _etapa_excel_a_html_multiple(ruta, carpeta, repeticiones, libro):
+    import converthtml
+    # Las filas y celdas se toman del generador para no cargar aquí el libro y alterar el pico de RSS
+    filas = libro['filas']
+    celdas = libro['celdas']
+    salida = os.path.join(carpeta, 'excel_a_html_multiple')
+    # Sin borrar la salida, salida.escribir omitiría las páginas idénticas y solo se mediría la comparación
+    tiempos = _cronometrar(lambda: converthtml.excel_a_html_multiple('Sintetico', ruta, salida), repeticiones,
+                           preparar=lambda: shutil.rmtree(salida, ignore_errors=True))
+    return tiempos, filas, celdas
+
+def _etapa_generar_html_hoja(ruta, carpeta, repeticiones, libro):
+    import converthtml
+    wb = load_workbook(ruta, data_only=True)
+    hojas = _hojas_convertidas(wb)
+    filas = sum(ws.max_row for ws in hojas)
+    celdas = sum(ws.max_row * ws.max_column for ws in hojas)
+    def generar():
+        for ws in hojas:
+            converthtml.generar_html_hoja(ws, ws.title, 'Sintetico')
+    return _cronometrar(generar, repeticiones), filas, celdas
+
+def _etapa_procesar_tabla(ruta, carpeta, repeticiones, libro):
+    import converthtml
+    wb = load_workbook(ruta, data_only=True)
+    tablas = []
+    for ws in _hojas_convertidas(wb):
+        hoja = converthtml.cargar_hoja(ws)
+        tablas.extend(
+            (hoja, start_row, end_row)
+            for tipo, start_row, end_row in converthtml.segmentar_hoja(hoja) if tipo == 'tabla'
+        )
+    filas = sum(end_row - start_row for _, start_row, end_row in tablas)
+    celdas = sum((end_row - start_row) * hoja['max_column'] for hoja, start_row, end_row in tablas)
+    def procesar():
+        for hoja, start_row, end_row in tablas:
+            converthtml.procesar_tabla(hoja, start_row, end_row)
+    return _cronometrar(procesar, repeticiones), filas, celdas
+
+def _etapa_formato(ruta, carpeta, repeticiones, backend):
+    import converthtml
+    import formato
+    # Páginas sin reglas aplicadas, como las dejaba la conversión antes de REGLAS_FORMATO
+    original = os.path.join(carpeta, f'formato_{backend}_original')
+    converthtml.excel_a_html_multiple('Sintetico', ruta, original, reglas=None)
+    paginas = sorted(nombre for nombre in os.listdir(original)
+                     if nombre.endswith('.html') and nombre != 'index.html')
+    filas = celdas = 0
+    for nombre in paginas:
+        with open(os.path.join(original, nombre), 'r', encoding='utf-8') as f:
+            html = f.read()
+        filas += html.count('<tr')
+        celdas += html.count('<td') + html.count('<th')
+
+    trabajo = os.path.join(carpeta, f'formato_{backend}')
+    archivos = [os.path.join(trabajo, nombre) for nombre in paginas]
+    def restaurar():
+        shutil.rmtree(trabajo, ignore_errors=True)
+        shutil.copytree(original, trabajo)
+    def transformar():
+        formato.apply_transforms(
+            archivos, [formato.convert_second_row_to_subheader, formato.delete_fuenteoficial], backend=backend
+        )
+    return _cronometrar(transformar, repeticiones, preparar=restaurar), filas, celdas
+
+def ejecutar_etapa(etapa, ruta, repeticiones, libro):
+    """
+    Ejecuta una etapa en el proceso actual y devuelve su resultado. libro son las
+    estadísticas de generar_libro_sintetico. Los mensajes de la conversión se descartan
+    para no medir la escritura en consola.
+    """
+    with tempfile.TemporaryDirectory() as carpeta, open(os.devnull, 'w') as nulo:
+        with contextlib.redirect_stdout(nulo):
+            if etapa.startswith('formato_'):
+                tiempos, filas, celdas = _etapa_formato(ruta, carpeta, repeticiones, etapa[len('formato_'):])
+            else:
+                tiempos, filas, celdas = globals()[f'_etapa_{etapa}'](ruta, carpeta, repeticiones, libro)
+    mejor = min(tiempos)
+    return {
+        'segundos': round(mejor, 4),
+        'segundos_media': round(sum(tiempos) / len(tiempos), 4),
+        'repeticiones': repeticiones,
+        'filas': filas,
+        'celdas': celdas,
+        'filas_por_segundo': round(filas / mejor, 1) if mejor else None,
+        'celdas_por_segundo': round(celdas / mejor, 1) if mejor else None,
+        'rss_pico_mb': pico_rss_mb()
+    }
+
+def version_codigo():
+    """Commit actual del repositorio, si se ejecuta dentro de uno."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(resultado, anterior):
+    """Imprime la variación de tiempo de cada etapa respecto a un resultado anterior."""
+    print(f"Comparación con {anterior.get('etiqueta') or anterior.get('version')} ({anterior.get('fecha')}):")
+    for etapa, datos in resultado['etapas'].items():
+        previo = anterior.get('etapas', {}).get(etapa)
+        if not previo or not previo.get('segundos'):
+            print(f"  {etapa}: sin datos anteriores")
+            continue
+        variacion = (datos['segundos'] / previo['segundos'] - 1) * 100
+        print(f"  {etapa}: {previo['segundos']:.3f}s -> {datos['segundos']:.3f}s ({variacion:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la conversión de Excel a HTML")
+    parser.add_argument('--filas', type=int, default=5000, help="filas de cuerpo de tabla en el libro")
+    parser.add_argument('--columnas', type=int, default=12)
+    parser.add_argument('--hojas', type=int, default=4)
+    parser.add_argument('--tablas', type=int, default=2, help="tablas por hoja")
+    parser.add_argument('--titulos', type=int, default=1, help="filas de título antes de cada tabla")
+    parser.add_argument('--combinadas', type=float, default=0.05, help="densidad de rangos combinados")
+    parser.add_argument('--porcentajes', type=float, default=0.1, help="proporción de celdas con porcentaje")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=ETAPAS)
+    parser.add_argument('--etiqueta', help="nombre libre para identificar la ejecución")
+    parser.add_argument('--salida', help="archivo JSON donde guardar los resultados")
+    parser.add_argument('--comparar', help="archivo JSON de una ejecución anterior")
+    args = parser.parse_args(argv)
+
+    parametros = {
+        'filas': args.filas, 'columnas': args.columnas, 'hojas': args.hojas,
+        'tablas_por_hoja': args.tablas, 'titulos_por_tabla': args.titulos,
+        'densidad_combinadas': args.combinadas, 'proporcion_porcentajes': args.porcentajes,
+        'semilla': args.semilla
+    }
+    resultado = {
+        'version': version_codigo(),
+        'etiqueta': args.etiqueta,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': parametros,
+        'etapas': {}
+    }
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'sintetico.xlsx')
+        print(f"Generando libro sintético: {parametros}")
+        resultado['libro'] = generar_libro_sintetico(ruta, **parametros)
+        resultado['libro']['bytes'] = os.path.getsize(ruta)
+
+        # Un proceso nuevo (spawn) por etapa para que el pico de RSS no arrastre el de otras etapas
+        contexto = multiprocessing.get_context('spawn')
+        for etapa in args.etapas:
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+                datos = pool.submit(ejecutar_etapa, etapa, ruta, args.repeticiones, resultado['libro']).result()
+            resultado['etapas'][etapa] = datos
+            print(f"{etapa}: {datos['segundos']:.3f}s, {datos['filas_por_segundo']} filas/s, "
+                  f"{datos['celdas_por_segundo']} celdas/s, pico RSS {datos['rss_pico_mb']} MB")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
+    return resultado
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+## Precompresión del sitio generado para servirlo como archivos estáticos
+##
+## precomprimir(carpeta) escribe junto a cada .html, .css y .js de al menos umbral bytes una
+## copia .gz y, si está instalado el paquete brotli, otra .br, para que el servidor web
+## (p. ej. gzip_static/brotli_static de nginx) las sirva sin comprimir en cada petición.
+## Cada copia lleva la misma fecha de modificación que su original, y solo se vuelven a
+## comprimir los archivos cuya fecha ya no coincide: los que salida.escribir reescribió porque
+## su contenido cambió. Las copias de archivos borrados o que quedaron por debajo del umbral
+## se eliminan. La compresión se reparte en un pool de procesos.
+##
+## Uso:
+##   python comprimir.py [carpeta] [--umbral BYTES] [--procesos N] [--sin-brotli]
+
+import argparse
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
+
+import instrumentacion
+import salida
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él solo se generan las copias .gz
+    brotli = None
+
+# Archivos que se comprimen y tamaño mínimo para que valga la pena
+EXTENSIONES = ('.html', '.css', '.js')
+UMBRAL_COMPRESION = int(os.getenv("CONVERTHTML_UMBRAL_COMPRESION", 1024))
+NIVEL_GZIP = 9
+CALIDAD_BROTLI = 11
+# La caché de páginas (ver converthtml.CacheRender) no se sirve
+CARPETAS_EXCLUIDAS = {'.cache'}
+
+def formatos_disponibles(usar_brotli=True):
+    """Extensiones de las copias que se generan: '.gz' y, si hay brotli, '.br'."""
+    if usar_brotli and brotli is not None:
+        return ('.gz', '.br')
+    return ('.gz',)
+
+def _comprimir(datos, formato):
+    if formato == '.gz':
+        # mtime=0 para que la copia dependa solo del contenido
+        return gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+    return brotli.compress(datos, mode=brotli.MODE_TEXT, quality=CALIDAD_BROTLI)
+
+def comprimir_archivo(ruta, formatos):
+    """
+    Escribe las copias comprimidas de ruta en los formatos indicados, con la fecha de
+    modificación del original. Devuelve (bytes del original, {formato: bytes de la copia}).
+    """
+    # La fecha se lee antes que el contenido: si el archivo cambia mientras tanto, la copia
+    # queda con la fecha anterior y se vuelve a comprimir en la siguiente ejecución
+    info = os.stat(ruta)
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    tamanos = {}
+    for formato in formatos:
+        comprimido = _comprimir(datos, formato)
+        salida.escribir(ruta + formato, comprimido)
+        os.utime(ruta + formato, ns=(info.st_atime_ns, info.st_mtime_ns))
+        tamanos[formato] = len(comprimido)
+    return len(datos), tamanos
+
+def _comprimible(ruta, umbral):
+    try:
+        return ruta.endswith(EXTENSIONES) and os.path.getsize(ruta) >= umbral
+    except FileNotFoundError:
+        return False
+
+def _copia_al_dia(copia, info):
+    try:
+        return os.stat(copia).st_mtime_ns == info.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def precomprimir(carpeta='html_output', umbral=UMBRAL_COMPRESION, procesos=None, usar_brotli=True):
+    """
+    Genera o actualiza las copias comprimidas de los archivos de carpeta (ver el
+    comentario del módulo). procesos es el tamaño del pool (por defecto, uno por CPU;
+    0 comprime en el propio proceso). Devuelve un resumen con los archivos comprimidos,
+    los que ya estaban al día, las copias eliminadas y los bytes antes y después por formato.
+    """
+    formatos = formatos_disponibles(usar_brotli)
+    pendientes = []
+    al_dia = 0
+    eliminadas = 0
+    with instrumentacion.tramo('precomprimir.buscar', carpeta=carpeta):
+        for directorio, subdirectorios, archivos in os.walk(carpeta):
+            subdirectorios[:] = [nombre for nombre in subdirectorios if nombre not in CARPETAS_EXCLUIDAS]
+            for nombre in archivos:
+                ruta = os.path.join(directorio, nombre)
+                original, extension = os.path.splitext(ruta)
+                if extension in ('.gz', '.br') and original.endswith(EXTENSIONES):
+                    # Copia huérfana: sin original, por debajo del umbral o de un formato que ya no se
+                    # genera. Los .gz/.br de otros archivos (p. ej. datos.csv.gz) no son de esta etapa
+                    if extension not in formatos or not _comprimible(original, umbral):
+                        os.remove(ruta)
+                        eliminadas += 1
+                    continue
+                if not _comprimible(ruta, umbral):
+                    continue
+                info = os.stat(ruta)
+                if all(_copia_al_dia(ruta + formato, info) for formato in formatos):
+                    al_dia += 1
+                else:
+                    pendientes.append(ruta)
+
+    resumen = {
+        'comprimidos': len(pendientes),
+        'al_dia': al_dia,
+        'copias_eliminadas': eliminadas,
+        'bytes_originales': 0,
+        'bytes_comprimidos': {formato: 0 for formato in formatos}
+    }
+    with instrumentacion.tramo('precomprimir.comprimir', archivos=len(pendientes)):
+        if procesos is None:
+            procesos = os.cpu_count() or 1
+        if procesos > 0 and len(pendientes) > 1:
+            with ProcessPoolExecutor(max_workers=min(procesos, len(pendientes))) as pool:
+                resultados = []
+                tamano_lote = max(1, len(pendientes) // (procesos * 4))
+                for resultado, registro in pool.map(partial(instrumentacion.ejecutar_en_proceso, comprimir_archivo,
+                                                            instrumentacion.activa()),
+                                                    pendientes, repeat(formatos), chunksize=tamano_lote):
+                    instrumentacion.incorporar(registro)
+                    resultados.append(resultado)
+        else:
+            resultados = [comprimir_archivo(ruta, formatos) for ruta in pendientes]
+    for tamano, tamanos in resultados:
+        resumen['bytes_originales'] += tamano
+        for formato, tamano_copia in tamanos.items():
+            resumen['bytes_comprimidos'][formato] += tamano_copia
+    instrumentacion.contar('archivos_precomprimidos', len(pendientes))
+    return resumen
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera copias .gz/.br de las páginas del sitio")
+    parser.add_argument('carpeta', nargs='?', default='html_output')
+    parser.add_argument('--umbral', type=int, default=UMBRAL_COMPRESION, help="bytes mínimos para comprimir")
+    parser.add_argument('--procesos', type=int, default=None, help="procesos del pool (0 = sin pool)")
+    parser.add_argument('--sin-brotli', action='store_true', help="generar solo las copias .gz")
+    args = parser.parse_args(argv)
+    imprimir_resumen(precomprimir(args.carpeta, args.umbral, args.procesos, not args.sin_brotli))
+
+def imprimir_resumen(resumen):
+    tamanos = ', '.join(
+        f"{formato} {tamano} bytes" for formato, tamano in resumen['bytes_comprimidos'].items()
+    )
+    print(f"Comprimidos: {resumen['comprimidos']} archivos ({resumen['bytes_originales']} bytes -> {tamanos}), "
+          f"al día: {resumen['al_dia']}, copias eliminadas: {resumen['copias_eliminadas']}")
+
+if __name__ == '__main__':
+    main()
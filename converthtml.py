@@ -2,110 +2,586 @@
 ## Author: Joseph A. Jimenez J.
 ## Josefu-Zero
 
-import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.utils import range_boundaries
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.xml.constants import SHEET_MAIN_NS
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
 import os
 import requests
 from io import BytesIO
 import re
+import json
+import hashlib
+import time
+import threading
+import tempfile
+import struct
+import unicodedata
+import shutil
+import multiprocessing
+from datetime import datetime, date, time as hora, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from itertools import islice
+from functools import lru_cache
+from zipfile import ZipFile, ZIP_STORED, BadZipFile
+from xml.etree.ElementTree import iterparse, fromstring, XMLPullParser
 from dotenv import load_dotenv
 from office365.runtime.auth.authentication_context import AuthenticationContext
 from office365.runtime.client_request_exception import ClientRequestException
+from office365.runtime.http.request_options import RequestOptions
 from office365.sharepoint.client_context import ClientContext
+import instrumentacion
+import plantillas
+import salida
+import comprimir
 
 # Cargar variables del entorno
 load_dotenv()  # Busca automáticamente el archivo .env
 
+# Hojas que no se convierten (patrones fnmatch sobre el nombre en minúsculas)
+HOJAS_EXCLUIDAS = ["índice", "datoscbox"]
+# Archivo con las huellas de las hojas convertidas en la última ejecución
+ARCHIVO_HUELLAS = '.huellas.json'
+# Manifiesto de la construcción del sitio, junto a html_output/indice.html
+ARCHIVO_MANIFIESTO = '.manifiesto.json'
+# Fragmento del índice de búsqueda de cada libro y buscador compartido (ver generar_indice_general)
+ARCHIVO_BUSQUEDA = 'busqueda.js'
+ARCHIVO_BUSCADOR = 'buscador.js'
+# Reglas de formato por página, aplicadas mientras se generan las tablas.
+# Cada regla indica la tabla (1 = primera tabla de la página) y, opcionalmente:
+#   'subencabezado': fila del cuerpo (1 = primera) que pasa al thead como <tr class="subheader">
+#   'eliminar_columnas': textos; se omiten las columnas cuyo subencabezado contiene alguno
+#   'proyeccion': predicado (encabezado, subencabezado) -> bool; solo se formatean y escriben
+#                 las columnas para las que devuelve True
+REGLAS_FORMATO = {
+    'planes-de-remediación.html': [{'tabla': 1, 'subencabezado': 1}],
+    'calidad.html': [{'tabla': 2, 'subencabezado': 1}],
+    'diccionario.html': [{'tabla': 1, 'subencabezado': 1, 'eliminar_columnas': ['(Fuente Oficial)']}],
+}
+# Segundos que se reutiliza la autenticación de SharePoint antes de renovarla
+DURACION_TOKEN_SHAREPOINT = int(os.getenv("SHAREPOINT_TOKEN_TTL", 3600))
+# Concurrencia por defecto del pipeline de descarga y conversión
+DESCARGAS_SIMULTANEAS = 4
+PROCESOS_CONVERSION = os.cpu_count() or 1
+# Bytes de una descarga que se guardan en memoria; por encima se vuelca a un archivo temporal
+UMBRAL_DESCARGA_EN_MEMORIA = int(os.getenv("SHAREPOINT_SPOOL_BYTES", 32 * 1024 * 1024))
+# Caché de páginas generadas, compartida por todos los libros (ver CacheRender)
+CARPETA_CACHE = '.cache'
+TAMANO_MAXIMO_CACHE = int(os.getenv("CONVERTHTML_CACHE_MB", 256)) * 1024 * 1024
+# Filas del cuerpo de una tabla a partir de las cuales se reparte en páginas (0 = nunca)
+FILAS_POR_PAGINA = int(os.getenv("CONVERTHTML_FILAS_POR_PAGINA", 1000))
+# Generar copias .gz/.br del sitio al terminar (ver comprimir.py)
+PRECOMPRIMIR = os.getenv("CONVERTHTML_PRECOMPRIMIR", "") not in ("", "0")
 
-def listar_archivos_excel_en_sharepoint():
-    try:
-        sitio_url = os.getenv("SHAREPOINT_URL")
-        sitio_completo = f"{sitio_url}/{os.getenv('SHAREPOINT_SITE')}"
+
+class SesionSharePoint:
+    """
+    Sesión autenticada contra el sitio de SharePoint que se reutiliza para el listado y
+    todas las descargas. Autentica una sola vez, conserva el ClientContext hasta que vence
+    DURACION_TOKEN_SHAREPOINT y descarga los archivos por una única requests.Session, de modo
+    que las conexiones HTTP se reutilizan. Ante una respuesta 401 vuelve a autenticarse y
+    reintenta la operación una vez.
+
+    fabrica_autenticacion permite sustituir la autenticación por usuario y contraseña,
+    por ejemplo para apuntar a un servidor SharePoint falso en pruebas locales.
+    """
+
+    def __init__(self, sitio_completo=None, carpeta=None, fabrica_autenticacion=None,
+                 duracion_token=DURACION_TOKEN_SHAREPOINT):
+        if sitio_completo is None:
+            sitio_completo = f"{os.getenv('SHAREPOINT_URL')}/{os.getenv('SHAREPOINT_SITE')}"
+        self.sitio_completo = sitio_completo
+        self.carpeta = carpeta or os.getenv("SHAREPOINT_DOC_PATH")
+        self.fabrica_autenticacion = fabrica_autenticacion or self._autenticar_usuario
+        self.duracion_token = duracion_token
+        self.http = requests.Session()
+        self._ctx = None
+        self._autenticado_en = 0
+        self._lock = threading.Lock()
+
+    def _autenticar_usuario(self, sitio_completo):
         ctx_auth = AuthenticationContext(sitio_completo)
         print(f"Autenticando en {sitio_completo} con usuario {os.getenv('SHAREPOINT_USER')}")
         if not ctx_auth.acquire_token_for_user(os.getenv("SHAREPOINT_USER"), os.getenv("SHAREPOINT_PASSWORD")):
             raise ValueError("Error de autenticación")
+        return ctx_auth
+
+    @property
+    def ctx(self):
+        """ClientContext autenticado; se renueva cuando vence el token."""
+        # Las descargas pueden ejecutarse en varios hilos; solo uno renueva la autenticación
+        with self._lock:
+            if self._ctx is None or time.monotonic() - self._autenticado_en > self.duracion_token:
+                with instrumentacion.tramo('sharepoint.autenticar'):
+                    self._ctx = ClientContext(self.sitio_completo, self.fabrica_autenticacion(self.sitio_completo))
+                self._autenticado_en = time.monotonic()
+            return self._ctx
+
+    def invalidar(self):
+        """Descarta la autenticación actual; la siguiente operación vuelve a autenticarse."""
+        self._ctx = None
+
+    def listar_metadatos_excel(self):
+        """
+        Lista los .xlsx de la carpeta junto con los metadatos que permiten saber si cambiaron
+        desde la última construcción (fecha de modificación, ETag y tamaño).
+        """
+        for intento in range(2):
+            try:
+                carpeta = self.ctx.web.get_folder_by_server_relative_url(self.carpeta)
+                archivos = carpeta.files
+                self.ctx.load(archivos)
+                with instrumentacion.tramo('sharepoint.listar'):
+                    self.ctx.execute_query()
+                break
+            except ClientRequestException as e:
+                if intento == 0 and e.response is not None and e.response.status_code == 401:
+                    self.invalidar()
+                    continue
+                raise
+        
+        return [
+            {
+                'nombre': archivo.properties["Name"],
+                'modificado': str(archivo.properties.get("TimeLastModified")),
+                'etag': archivo.properties.get("ETag"),
+                'tamano': int(archivo.properties.get("Length") or 0)
+            }
+            for archivo in archivos if archivo.properties["Name"].endswith('.xlsx')
+        ]
+
+    def descargar(self, nombre_archivo, destino):
+        """
+        Descarga el contenido del archivo en el objeto de archivo destino, sin pedir antes
+        sus metadatos. Devuelve el número de bytes escritos.
+        """
+        file_url = f"{self.carpeta}/{nombre_archivo}"
+        for intento in range(2):
+            # La biblioteca escapa la ruta para OData (' como '', # como %23, % como %25)
+            url = self.ctx.web.get_file_by_server_relative_path(file_url).resource_url + "/$value"
+            request = RequestOptions(url)
+            self.ctx.authentication_context.authenticate_request(request)
+            with instrumentacion.tramo('sharepoint.descargar', archivo=nombre_archivo), \
+                    self.http.get(url, headers=request.headers, stream=True) as response:
+                if response.status_code == 401 and intento == 0:
+                    self.invalidar()
+                    continue
+                response.raise_for_status()
+                escritos = 0
+                for bloque in response.iter_content(chunk_size=1 << 20):
+                    destino.write(bloque)
+                    escritos += len(bloque)
+                instrumentacion.contar('bytes_descargados', escritos)
+                return escritos
+
+    def abrir_excel(self, nombre_archivo):
+        """Descarga el archivo (ver descargar_excel_desde_sharepoint); None si falla."""
+        return descargar_excel_desde_sharepoint(nombre_archivo, self)
 
-        ctx = ClientContext(sitio_completo, ctx_auth)
-        carpeta = ctx.web.get_folder_by_server_relative_url(os.getenv("SHAREPOINT_DOC_PATH"))
-        archivos = carpeta.files
-        ctx.load(archivos)
-        ctx.execute_query()
+    def liberar(self, contenido):
+        liberar_descarga(contenido)
 
-        return [archivo.properties["Name"] for archivo in archivos if archivo.properties["Name"].endswith('.xlsx')]
+class DescargaTemporal:
+    """
+    Destino de una descarga: se guarda en memoria hasta umbral_memoria bytes y a partir de ahí
+    se vuelca a un archivo temporal en disco (como tempfile.SpooledTemporaryFile, pero con
+    nombre, para que el libro se pueda abrir por ruta, también desde otro proceso).
+    """
+    def __init__(self, umbral_memoria=UMBRAL_DESCARGA_EN_MEMORIA):
+        self.umbral_memoria = umbral_memoria
+        self.memoria = BytesIO()
+        self.archivo = None
+    
+    def write(self, bloque):
+        if self.archivo is None and self.memoria.tell() + len(bloque) > self.umbral_memoria:
+            self.archivo = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+            self.archivo.write(self.memoria.getbuffer())
+            self.memoria = None
+        if self.archivo is not None:
+            self.archivo.write(bloque)
+        else:
+            self.memoria.write(bloque)
+    
+    def contenido(self):
+        """Devuelve la ruta del archivo temporal si se volcó a disco, o el BytesIO rebobinado."""
+        if self.archivo is not None:
+            self.archivo.close()
+            return self.archivo.name
+        self.memoria.seek(0)
+        return self.memoria
     
+    def descartar(self):
+        if self.archivo is not None:
+            self.archivo.close()
+            liberar_descarga(self.archivo.name)
+
+def liberar_descarga(contenido):
+    """Borra el archivo temporal de una descarga volcada a disco (no hace nada con un BytesIO)."""
+    if isinstance(contenido, str):
+        try:
+            os.remove(contenido)
+        except OSError:
+            pass
+
+_sesion_sharepoint = None
+
+def obtener_sesion_sharepoint():
+    """Devuelve la sesión de SharePoint compartida por el proceso, creándola si hace falta."""
+    global _sesion_sharepoint
+    if _sesion_sharepoint is None:
+        _sesion_sharepoint = SesionSharePoint()
+    return _sesion_sharepoint
+
+def listar_archivos_excel_en_sharepoint(sesion=None):
+    return [metadatos['nombre'] for metadatos in listar_metadatos_excel_en_sharepoint(sesion)]
+
+def listar_metadatos_excel_en_sharepoint(sesion=None):
+    """
+    Lista los .xlsx de la carpeta de SharePoint junto con los metadatos que permiten
+    saber si cambiaron desde la última construcción (fecha de modificación, ETag y tamaño).
+    """
+    try:
+        return (sesion or obtener_sesion_sharepoint()).listar_metadatos_excel()
     except ClientRequestException as e:
         print(f"Error al listar archivos: {e}")
         return []
 
-def descargar_excel_desde_sharepoint(nombre_archivo):
+def descargar_excel_desde_sharepoint(nombre_archivo, sesion=None, umbral_memoria=UMBRAL_DESCARGA_EN_MEMORIA):
+    """
+    Descarga un .xlsx por bloques. Si ocupa hasta umbral_memoria bytes se devuelve en un
+    BytesIO; si es mayor se devuelve la ruta de un archivo temporal, que excel_a_html_multiple
+    abre por ruta sin copiarlo a memoria y que hay que borrar con liberar_descarga al terminar.
+    """
+    destino = DescargaTemporal(umbral_memoria)
     try:
-        sitio_url = os.getenv("SHAREPOINT_URL")
-        sitio_completo = f"{sitio_url}/{os.getenv('SHAREPOINT_SITE')}"
-        ctx_auth = AuthenticationContext(sitio_completo)
-        if not ctx_auth.acquire_token_for_user(os.getenv("SHAREPOINT_USER"), os.getenv("SHAREPOINT_PASSWORD")):
-            raise ValueError("Error de autenticación")
-        
-        ctx = ClientContext(sitio_completo, ctx_auth)
-        file_url = f"{os.getenv('SHAREPOINT_DOC_PATH')}/{nombre_archivo}"
-        file = ctx.web.get_file_by_server_relative_path(file_url)
-        ctx.load(file)
-        ctx.execute_query()
-
-        file_content = BytesIO()
-        file.download(file_content).execute_query()
-        file_content.seek(0)
-        return file_content
+        (sesion or obtener_sesion_sharepoint()).descargar(nombre_archivo, destino)
+        return destino.contenido()
     except Exception as e:
+        destino.descartar()
         print(f"Error al descargar {nombre_archivo}: {e}")
         return None
 
-def procesar_todos_los_excel():
-    archivos_excel = listar_archivos_excel_en_sharepoint()
+# Orígenes de los libros para procesar_todos_los_excel. Además de SesionSharePoint hay
+# orígenes locales para reconstruir el sitio sin conexión a partir de una copia de la
+# biblioteca. Todos ofrecen:
+#   listar_metadatos_excel() -> [{'nombre', 'modificado', 'etag', 'tamano'}]
+#   abrir_excel(nombre) -> ruta, archivo binario o None, que se pasa a excel_a_html_multiple
+#   liberar(contenido) -> libera lo devuelto por abrir_excel una vez convertido
+
+class OrigenCarpetaLocal:
+    """
+    Libros .xlsx de una carpeta local (sin subcarpetas). Se listan con os.scandir y se
+    convierten directamente desde su ruta, sin copiarlos.
+    """
+
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+
+    def listar_metadatos_excel(self):
+        metadatos = []
+        with os.scandir(self.carpeta) as entradas:
+            for entrada in entradas:
+                # Los ~$*.xlsx son los archivos de bloqueo que deja Excel abierto
+                if not entrada.name.endswith('.xlsx') or entrada.name.startswith('~$') or not entrada.is_file():
+                    continue
+                info = entrada.stat()
+                metadatos.append({
+                    'nombre': entrada.name,
+                    'modificado': datetime.fromtimestamp(info.st_mtime).isoformat(),
+                    'etag': f"{info.st_mtime_ns}-{info.st_size}",
+                    'tamano': info.st_size
+                })
+        # os.scandir no garantiza ningún orden; se ordena para que las construcciones se repitan igual
+        return sorted(metadatos, key=lambda metadato: metadato['nombre'])
+
+    def abrir_excel(self, nombre_archivo):
+        return os.path.join(self.carpeta, nombre_archivo)
+
+    def liberar(self, contenido):
+        pass
+
+class SegmentoArchivo:
+    """
+    Vista de solo lectura de un tramo [inicio, inicio + tamano) de un archivo, con la interfaz
+    de archivo que necesitan zipfile y openpyxl. Solo guarda la ruta y la posición, así que se
+    puede enviar a otro proceso, que abre el archivo por su cuenta.
+    """
+
+    def __init__(self, ruta, inicio, tamano):
+        self.ruta = ruta
+        self.inicio = inicio
+        self.tamano = tamano
+        self.posicion = 0
+        self._archivo = None
+
+    def __getstate__(self):
+        estado = dict(self.__dict__)
+        estado['_archivo'] = None
+        return estado
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.posicion
+
+    def seek(self, desplazamiento, desde=os.SEEK_SET):
+        if desde == os.SEEK_CUR:
+            desplazamiento += self.posicion
+        elif desde == os.SEEK_END:
+            desplazamiento += self.tamano
+        self.posicion = max(0, desplazamiento)
+        return self.posicion
+
+    def read(self, n=-1):
+        restante = max(0, self.tamano - self.posicion)
+        if n is None or n < 0 or n > restante:
+            n = restante
+        if self._archivo is None:
+            self._archivo = open(self.ruta, 'rb')
+        self._archivo.seek(self.inicio + self.posicion)
+        datos = self._archivo.read(n)
+        self.posicion += len(datos)
+        return datos
+
+    def close(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+class OrigenZip:
+    """
+    Libros .xlsx dentro de un archivo zip (por ejemplo, una copia de la biblioteca de
+    SharePoint). Los libros guardados sin compresión en el zip se leen en su sitio a través
+    de un SegmentoArchivo; los comprimidos se descomprimen a memoria. Si hay varios libros
+    con el mismo nombre en carpetas distintas del zip, se usa el primero.
+    """
+
+    def __init__(self, ruta_zip):
+        self.ruta_zip = ruta_zip
+
+    def _miembros(self, archivo):
+        miembros = {}
+        for info in archivo.infolist():
+            nombre = os.path.basename(info.filename)
+            if info.is_dir() or not nombre.endswith('.xlsx') or nombre.startswith('~$'):
+                continue
+            miembros.setdefault(nombre, info)
+        return miembros
+
+    def listar_metadatos_excel(self):
+        with ZipFile(self.ruta_zip) as archivo:
+            return [
+                {
+                    'nombre': nombre,
+                    'modificado': datetime(*info.date_time).isoformat(),
+                    'etag': f"{info.CRC:08x}",
+                    'tamano': info.file_size
+                }
+                for nombre, info in sorted(self._miembros(archivo).items())
+            ]
+
+    def abrir_excel(self, nombre_archivo):
+        try:
+            with ZipFile(self.ruta_zip) as archivo:
+                info = self._miembros(archivo)[nombre_archivo]
+                if info.compress_type != ZIP_STORED:
+                    return BytesIO(archivo.read(info))
+                # Los datos empiezan tras la cabecera local, cuyo campo extra puede no
+                # coincidir con el del directorio central
+                with open(self.ruta_zip, 'rb') as f:
+                    f.seek(info.header_offset)
+                    cabecera = f.read(30)
+                largo_nombre, largo_extra = struct.unpack('<HH', cabecera[26:30])
+                inicio = info.header_offset + 30 + largo_nombre + largo_extra
+                return SegmentoArchivo(self.ruta_zip, inicio, info.file_size)
+        except (OSError, KeyError, BadZipFile) as e:
+            print(f"Error al abrir {nombre_archivo}: {e}")
+            return None
+
+    def liberar(self, contenido):
+        if contenido is not None:
+            contenido.close()
+
+def leer_manifiesto(carpeta_salida='html_output'):
+    """Lee el manifiesto de la construcción anterior, o {} si no existe."""
+    try:
+        with open(os.path.join(carpeta_salida, ARCHIVO_MANIFIESTO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_manifiesto(manifiesto, carpeta_salida='html_output'):
+    salida.escribir(os.path.join(carpeta_salida, ARCHIVO_MANIFIESTO),
+                    json.dumps(manifiesto, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def version_construccion(reglas=REGLAS_FORMATO, filas_por_pagina=FILAS_POR_PAGINA):
+    """
+    Huella de la configuración con la que se convierten los libros: versión del conversor,
+    reglas de formato de todas las páginas y filas_por_pagina (ver configuracion_render).
+    Se guarda en cada entrada del manifiesto; si cambia, los libros se vuelven a convertir
+    aunque sus metadatos en SharePoint sean los mismos.
+    """
+    return hashlib.sha256(configuracion_render(reglas, filas_por_pagina).encode('utf-8')).hexdigest()
+
+def procesar_todos_los_excel(incremental=False, sesion=None,
+                             descargas_simultaneas=DESCARGAS_SIMULTANEAS,
+                             procesos_conversion=PROCESOS_CONVERSION, origen=None, usar_cache=True,
+                             precomprimir=PRECOMPRIMIR):
+    """
+    Descarga y convierte todos los .xlsx de origen (OrigenCarpetaLocal, OrigenZip o, por
+    defecto, la sesión de SharePoint) y genera el índice general, en el orden del listado.
+    incremental=True omite los libros que no cambiaron (ver version_construccion); las
+    descargas usan descargas_simultaneas hilos y las conversiones procesos_conversion procesos
+    (0 = en el propio proceso); usar_cache activa CacheRender y precomprimir, comprimir.py.
+    """
+    origen = origen or sesion or obtener_sesion_sharepoint()
+    if isinstance(origen, SesionSharePoint):
+        archivos_excel = listar_metadatos_excel_en_sharepoint(origen)
+    else:
+        try:
+            archivos_excel = origen.listar_metadatos_excel()
+        except (OSError, BadZipFile) as e:
+            print(f"Error al listar archivos: {e}")
+            archivos_excel = []
+    salida.reiniciar()
+    manifiesto = leer_manifiesto() if incremental else {}
+    # Los procesos de conversión no heredan el estado del módulo; las reglas se les pasan
+    reglas, filas_por_pagina = REGLAS_FORMATO, FILAS_POR_PAGINA
+    version = version_construccion(reglas, filas_por_pagina)
+    manifiesto_actual = {}
     indice_general = []
+    cache = CacheRender(os.path.join('html_output', CARPETA_CACHE)) if usar_cache else None
     
-    for archivo in archivos_excel:
-        print(f"Procesando: {archivo}")
-        contenido = descargar_excel_desde_sharepoint(archivo)
-        if contenido:
-            nombre_base = os.path.splitext(archivo)[0]
-            print(f"Creando carpeta para: {nombre_base}")
-            carpeta_salida = f"html_output/{nombre_base}"
-            os.makedirs(carpeta_salida, exist_ok=True)
+    limite = threading.BoundedSemaphore(descargas_simultaneas + max(procesos_conversion, 1))
+    if procesos_conversion > 0:
+        # spawn y no fork: el primer submit ocurre en un hilo de descarga mientras otros hilos
+        # pueden tener tomados los locks de instrumentacion, salida o urllib3, y un proceso
+        # creado con fork heredaría esos locks tomados
+        conversiones = ProcessPoolExecutor(max_workers=procesos_conversion,
+                                           mp_context=multiprocessing.get_context('spawn'))
+    else:
+        conversiones = ThreadPoolExecutor(max_workers=1)
+    
+    def descargar_y_convertir(archivo):
+        # Descarga en un hilo y encola la conversión; devuelve el futuro de la conversión
+        contenido = None
+        try:
+            with instrumentacion.tramo('abrir_excel', archivo=archivo):
+                contenido = origen.abrir_excel(archivo)
+            if contenido:
+                nombre_base = os.path.splitext(archivo)[0]
+                print(f"Creando carpeta para: {nombre_base}")
+                carpeta_salida = f"html_output/{nombre_base}"
+                os.makedirs(carpeta_salida, exist_ok=True)
+                
+                # Procesar el archivo (usando tu función existente)
+                if procesos_conversion > 0:
+                    conversion = conversiones.submit(instrumentacion.ejecutar_en_proceso, excel_a_html_multiple,
+                                                     instrumentacion.activa(), nombre_base, contenido, carpeta_salida,
+                                                     reglas=reglas, cache=cache, filas_por_pagina=filas_por_pagina)
+                else:
+                    conversion = conversiones.submit(excel_a_html_multiple, nombre_base, contenido, carpeta_salida,
+                                                     reglas=reglas, cache=cache, filas_por_pagina=filas_por_pagina)
+                def terminar(_, contenido=contenido):
+                    origen.liberar(contenido)
+                    limite.release()
+                conversion.add_done_callback(terminar)
+                return conversion
+        except Exception as e:
+            print(f"Error al procesar {archivo}: {e}")
+        if contenido is not None:
+            origen.liberar(contenido)
+        limite.release()
+        return None
+    
+    with conversiones, ThreadPoolExecutor(max_workers=descargas_simultaneas) as descargas:
+        tareas = []
+        for metadatos in archivos_excel:
+            archivo = metadatos['nombre']
+            entrada = manifiesto.get(archivo)
+            if (entrada and entrada['metadatos'] == metadatos and entrada.get('version') == version and
+                    os.path.exists(os.path.join('html_output', entrada['archivo']))):
+                print(f"Sin cambios, se omite: {archivo}")
+                tareas.append((metadatos, entrada, None))
+                continue
+            
+            print(f"Procesando: {archivo}")
+            limite.acquire()
+            tareas.append((metadatos, None, descargas.submit(descargar_y_convertir, archivo)))
+        
+        # Recoger los resultados en el orden del listado
+        for metadatos, entrada, descarga in tareas:
+            archivo = metadatos['nombre']
+            if descarga is None:
+                indice_general.append({
+                    'nombre': entrada['nombre'],
+                    'archivo': entrada['archivo']
+                })
+                manifiesto_actual[archivo] = entrada
+                continue
             
-            # Procesar el archivo (usando tu función existente)
-            indice_archivo = excel_a_html_multiple(nombre_base,contenido, carpeta_salida)
+            conversion = descarga.result()
+            if conversion is None:
+                continue
+            try:
+                resultado = conversion.result()
+            except Exception as e:
+                print(f"Error al convertir {archivo}: {e}")
+                continue
+            if procesos_conversion > 0:
+                instrumentacion.incorporar(resultado[1])
+            
+            nombre_base = os.path.splitext(archivo)[0]
             carpeta_salida =f"{nombre_base}"## Uso unico para el nombre de la carpeta
             indice_general.append({
                 'nombre': nombre_base,
                 'archivo': f"{carpeta_salida}/index.html"
             })
+            manifiesto_actual[archivo] = {
+                'metadatos': metadatos,
+                'version': version,
+                'nombre': nombre_base,
+                'archivo': f"{carpeta_salida}/index.html"
+            }
     
     # Generar índice general
     if indice_general:
-        generar_indice_general(indice_general)
+        with instrumentacion.tramo('indice_general'):
+            generar_indice_general(indice_general)
         print(f"Índice general creado en: html_output/indice.html")
+        guardar_manifiesto(manifiesto_actual)
     else:
         print("No se encontraron archivos .xlsx en la carpeta.")
+    escrito = salida.resumen()
+    print(f"Archivos escritos: {escrito['archivos_cambiados']} ({escrito['bytes_cambiados']} bytes), "
+          f"sin cambios: {escrito['archivos_sin_cambios']}")
+    if precomprimir:
+        with instrumentacion.tramo('precomprimir'):
+            comprimir.imprimir_resumen(comprimir.precomprimir('html_output', procesos=procesos_conversion))
     
     return indice_general
 
-def es_texto_aislado(ws, row_idx, merged_cells):
-    row = ws[row_idx]
-    
-    # Considerar celdas combinadas en el conteo
+def contar_celdas_contenido(fila):
+    # Las celdas combinadas ya vienen resueltas en la cuadrícula
     celdas_contenido = 0
-    for cell in row:
-        cell_value = obtener_valor_celda_combinada(ws, row_idx, cell.column, merged_cells)
+    for cell_value in fila:
         if cell_value is not None and str(cell_value).strip():
             celdas_contenido += 1
-    
+    return celdas_contenido
+
+def es_texto_aislado(fila, celdas_contenido):
     if celdas_contenido < 2:
         return True
     
     # Verificar patrón de título
-    first_cell_value = str(row[0].value).strip() if row[0].value else ""
+    first_cell_value = str(fila[0]).strip() if fila[0] else ""
     if (first_cell_value and 
         first_cell_value.isupper() and 
         len(first_cell_value) > 10 and
@@ -114,22 +590,12 @@ def es_texto_aislado(ws, row_idx, merged_cells):
     
     return False
 
-def procesar_texto_aislado(ws, row_idx, merged_cells, sheet_name):
+def procesar_texto_aislado(hoja, row_idx, sheet_name):
     """
     Procesa una fila de texto aislado y devuelve el HTML correspondiente.
     """
-    row = ws[row_idx]
     contenido = []
-    for cell in row:
-        cell_value = cell.value
-        # Verificar si la celda es parte de un rango combinado
-        for merged in merged_cells:
-            if cell.coordinate in merged['range']:
-                if (cell.row, cell.column) == merged['first_cell']:
-                    cell_value = merged['value']
-                else:
-                    cell_value = None
-                break
+    for cell_value in hoja['valores'][row_idx - 1]:
         if cell_value is not None:
             contenido.append(str(cell_value).strip())
     # No agregar nada si el texto es igual al nombre de la hoja (sheet_name)
@@ -142,332 +608,1282 @@ def procesar_texto_aislado(ws, row_idx, merged_cells, sheet_name):
     else:
         return f'<div class="texto-contenido">{texto}</div>\n'
 
-def obtener_valor_celda_combinada(ws, row_idx, col_idx, merged_cells):
+def materializar_hoja(ws, merged_cells):
     """
-    Devuelve el valor correcto para una celda, manejando celdas combinadas.
-    Si la celda es parte de un rango combinado, devuelve el valor de la primera celda.
-    Si no, devuelve el valor normal de la celda.
+    Lee la hoja en una sola pasada y devuelve una cuadrícula en memoria.
+    'valores' contiene los valores por fila con las celdas combinadas ya resueltas
+    (solo la primera celda del rango conserva el valor) y 'porcentajes' indica,
+    en paralelo, qué celdas numéricas tienen formato de porcentaje.
+    Acepta hojas normales y hojas de solo lectura (modo streaming).
     """
-    for merged in merged_cells:
-        min_row, min_col, max_row, max_col = merged['bounds']
-        if (min_row <= row_idx <= max_row and 
-            min_col <= col_idx <= max_col):
-            # Si es la primera celda del rango, devolver su valor
-            if row_idx == min_row and col_idx == min_col:
-                return merged['value']
-            # Si no es la primera celda, devolver None (celda combinada)
-            else:
-                return None
-    # Si no está en ningún rango combinado, devolver valor normal
-    return ws.cell(row=row_idx, column=col_idx).value
+    solo_lectura = isinstance(ws, ReadOnlyWorksheet)
+    if solo_lectura:
+        # La dimensión declarada en el XML puede ser incorrecta; se calcula al leer
+        ws.reset_dimensions()
+    valores = []
+    porcentajes = []
+    # Leer number_format es caro en openpyxl: se clasifica una sola vez por estilo
+    # (solo lectura) o por identificador de formato (hoja normal) distinto
+    formatos_porcentaje = {}
+    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column):
+        fila = [cell.value for cell in row]
+        flags = []
+        for cell, cell_value in zip(row, fila):
+            if not isinstance(cell_value, (int, float)):
+                flags.append(False)
+                continue
+            clave = cell._style_id if solo_lectura else cell._style.numFmtId
+            es_porcentaje = formatos_porcentaje.get(clave)
+            if es_porcentaje is None:
+                es_porcentaje = formatos_porcentaje[clave] = '%' in cell.number_format
+            flags.append(es_porcentaje)
+        valores.append(fila)
+        porcentajes.append(flags)
+    
+    # En modo streaming cada fila trae solo sus propias celdas; completar la cuadrícula
+    max_column = max((len(fila) for fila in valores), default=0)
+    for fila, flags in zip(valores, porcentajes):
+        if len(fila) < max_column:
+            fila.extend([None] * (max_column - len(fila)))
+            flags.extend([False] * (max_column - len(flags)))
+    
+    # Resolver celdas combinadas sobre la cuadrícula
+    for (row_idx, col_idx), merged in merged_cells.items():
+        if row_idx > len(valores) or col_idx > max_column:
+            continue
+        if (row_idx, col_idx) != merged['first_cell']:
+            valores[row_idx - 1][col_idx - 1] = None
+            porcentajes[row_idx - 1][col_idx - 1] = False
+    
+    return {
+        'valores': valores,
+        'porcentajes': porcentajes,
+        'max_row': len(valores),
+        'max_column': max_column
+    }
 
-def procesar_tabla(ws, start_row, merged_cells):
+def clasificar_filas(hoja):
     """
-    Procesa una tabla desde la fila start_row y devuelve el HTML y número de filas procesadas.
-    Combina celdas de encabezado vacías adyacentes usando colspan.
+    Calcula una sola vez por fila las características usadas para segmentar la hoja:
+    número de celdas con contenido, si la fila está vacía y si es texto aislado.
     """
-    # Determinar el alcance de la tabla
-    end_row = start_row
-    while end_row <= ws.max_row:
-        if es_texto_aislado(ws, end_row, merged_cells):
-            break
-        end_row += 1
-    
-    # Crear DataFrame con el rango de la tabla
-    data = []
+    hoja['celdas_contenido'] = []
+    hoja['vacias'] = []
+    hoja['texto_aislado'] = []
+    for fila in hoja['valores']:
+        celdas_contenido = contar_celdas_contenido(fila)
+        hoja['celdas_contenido'].append(celdas_contenido)
+        hoja['vacias'].append(all(cell_value is None for cell_value in fila))
+        hoja['texto_aislado'].append(es_texto_aislado(fila, celdas_contenido))
+    return hoja
+
+def segmentar_hoja(hoja):
+    """
+    Recorre las filas clasificadas en una sola pasada y devuelve los segmentos de la hoja
+    como tuplas (tipo, fila_inicio, fila_fin), con tipo 'texto' o 'tabla' y fila_fin exclusiva.
+    Una tabla termina en la primera fila que sea texto aislado (las filas vacías lo son).
+    """
+    segmentos = []
+    current_row = 1
+    while current_row <= hoja['max_row']:
+        if hoja['vacias'][current_row - 1]:
+            current_row += 1
+        elif hoja['texto_aislado'][current_row - 1]:
+            segmentos.append(('texto', current_row, current_row + 1))
+            current_row += 1
+        else:
+            end_row = current_row + 1
+            while end_row <= hoja['max_row'] and not hoja['texto_aislado'][end_row - 1]:
+                end_row += 1
+            segmentos.append(('tabla', current_row, end_row))
+            current_row = end_row
+    return segmentos
+
+def formatear_celda(cell_value, es_porcentaje):
+    # Process percentage values
+    if es_porcentaje:
+        return f"{cell_value:.2%}"# Convertir a porcentaje con 2 decimales
+    elif cell_value is not None:
+        return str(cell_value).strip()# convertir a string y eliminar espacios
+    return None
+
+def columnas_ocupadas(filas, columnas):
+    """
+    Devuelve, de las columnas indicadas, las que tienen alguna celda distinta de None.
+    Las columnas ocupadas se marcan en un único recorrido de las filas.
+    """
+    ocupadas = [False] * (max(columnas, default=-1) + 1)
+    for fila in filas:
+        for col_idx in columnas:
+            if fila[col_idx] is not None:
+                ocupadas[col_idx] = True
+    return [col_idx for col_idx in columnas if ocupadas[col_idx]]
+
+def encabezados_de_grupo(headers):
+    """
+    Devuelve, para cada columna, el texto del encabezado que la cubre: el propio si no está
+    vacío o el del encabezado no vacío más cercano a la izquierda (celdas combinadas con colspan).
+    """
+    grupos = []
+    actual = ''
+    for header in headers:
+        if header is not None and str(header).strip() != '':
+            actual = header
+        grupos.append(actual)
+    return grupos
+
+def html_fila_tabla(row, clase=None):
+    """Devuelve el <tr> de una fila del cuerpo (o del subencabezado) de una tabla."""
+    fila_html = [f'    <tr class="{clase}">\n' if clase else '    <tr>\n']
+    for cell_value in row:
+        if isinstance(cell_value, str) and cell_value.endswith('%'):
+            fila_html.append(f'      <td class="percentage-cell">{cell_value}</td>\n')
+        else:
+            fila_html.append(f'      <td>{cell_value if cell_value is not None else ""}</td>\n')
+    fila_html.append('    </tr>\n')
+    return ''.join(fila_html)
+
+# Filas del cuerpo de una tabla que se formatean juntas, columna a columna
+FILAS_POR_BLOQUE = 256
+
+# Tipos de valor cuyo texto nunca tiene espacios sobrantes ni termina en '%'
+TIPOS_SIN_TEXTO = frozenset({type(None), int, float, bool, datetime, date, hora, timedelta})
+
+TD_VACIA = '      <td></td>\n'
+
+def html_celda(texto):
+    """Devuelve el <td> de una celda ya formateada con formatear_celda."""
+    if texto is None:
+        return TD_VACIA
+    if texto.endswith('%'):
+        return f'      <td class="percentage-cell">{texto}</td>\n'
+    return f'      <td>{texto}</td>\n'
+
+def celdas_columna(valores, porcentajes):
+    """
+    Devuelve los <td> de una columna de un bloque de filas, igual que formatear_celda y
+    html_fila_tabla celda a celda. El tipo de la columna se decide una vez por bloque:
+    si no tiene porcentajes ni textos, todas las celdas usan el mismo patrón sin más
+    comprobaciones.
+    """
+    if all(porcentajes):
+        return [f'      <td class="percentage-cell">{cell_value:.2%}</td>\n' for cell_value in valores]
+    if any(porcentajes):
+        return [
+            f'      <td class="percentage-cell">{cell_value:.2%}</td>\n' if es_porcentaje
+            else html_celda(formatear_celda(cell_value, False))
+            for cell_value, es_porcentaje in zip(valores, porcentajes)
+        ]
+    if set(map(type, valores)) <= TIPOS_SIN_TEXTO:
+        return [TD_VACIA if cell_value is None else f'      <td>{cell_value}</td>\n' for cell_value in valores]
+    return [
+        TD_VACIA if cell_value is None else html_celda(str(cell_value).strip())
+        for cell_value in valores
+    ]
+
+def iterar_filas_html(filas, columnas):
+    """
+    Genera los <tr> del cuerpo de una tabla a partir de pares (fila, porcentajes) de la
+    cuadrícula, con solo las columnas indicadas. Las filas se formatean por bloques de
+    FILAS_POR_BLOQUE, columna a columna, y se devuelven de una en una para poder
+    escribirlas o paginarlas sin tener la tabla entera en memoria.
+    """
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, FILAS_POR_BLOQUE))
+        if not bloque:
+            return
+        if not columnas:
+            yield from ('    <tr>\n    </tr>\n' for _ in bloque)
+            continue
+        # Trasponer el bloque: una tupla de valores y otra de porcentajes por columna
+        valores = list(zip(*(fila for fila, _ in bloque)))
+        porcentajes = list(zip(*(porcentajes for _, porcentajes in bloque)))
+        columnas_html = [celdas_columna(valores[col_idx], porcentajes[col_idx]) for col_idx in columnas]
+        for celdas in zip(*columnas_html):
+            yield '    <tr>\n' + ''.join(celdas) + '    </tr>\n'
+
+def estructura_tabla(hoja, start_row, end_row, regla=None, proyeccion=None):
+    """
+    Decide qué se muestra de la tabla entre start_row y end_row (exclusiva), sin generar HTML:
+    las filas no vacías, el subencabezado según la regla y las columnas que sobreviven a la
+    proyección y a las columnas vacías. La usan iterar_html_tabla y el índice de búsqueda,
+    que así solo indexa lo que se publica. Devuelve None si la tabla no tiene filas, o
+    {'filas': [(fila, porcentajes), ...] (encabezado y cuerpo, sin el subencabezado),
+     'subencabezado': textos o None, 'conservadas': índices de columna,
+     'encabezados': [(texto, colspan), ...] de los <th> que quedan}.
+    """
+    # Filas de la tabla en la cuadrícula, sin las filas completamente vacías
+    filas = []
     for row_idx in range(start_row, end_row):
-        row_data = []
-        for col_idx in range(1, ws.max_column + 1):  # Columnas de 1 a max_column
-            # Usar función auxiliar para celdas combinadas
-            cell_value = obtener_valor_celda_combinada(ws, row_idx, col_idx, merged_cells)
-            cell = ws.cell(row=row_idx, column=col_idx)
-            cell_number_format = cell.number_format
-            
-            # Process percentage values
-            if isinstance(cell_value, (int, float)) and '%' in cell_number_format:
-                cell_value = f"{cell_value:.2%}"# Convertir a porcentaje con 2 decimales
-            elif cell_value is not None:
-                cell_value = str(cell_value).strip()# convertir a string y eliminar espacios
-            
-            row_data.append(cell_value)
-        data.append(row_data)
+        fila = hoja['valores'][row_idx - 1]
+        if any(cell_value is not None for cell_value in fila):
+            filas.append((fila, hoja['porcentajes'][row_idx - 1]))
     
-    # Limpiar DataFrame (eliminar filas/columnas completamente vacías)
-    df = pd.DataFrame(data).dropna(how='all').dropna(axis=1, how='all')
-    # Generar HTML de la tabla
-    html = '<div class="tabla-contenedor">\n'
-    if len(df) > 0:
-        # Procesar encabezados para combinar celdas vacías adyacentes
-        headers = df.iloc[0].tolist()
-        processed_headers = []
-        i = 0
-        while i < len(headers):
-            if headers[i] is not None and str(headers[i]).strip() != '':
-                # Contar celdas vacías siguientes
-                colspan = 1
-                j = i + 1
-                while j < len(headers) and (headers[j] is None or str(headers[j]).strip() == ''):
-                    colspan += 1
-                    j += 1
-                if colspan > 1:
-                    processed_headers.append(f'<th colspan="{colspan}">{headers[i]}</th>')
-                else:
-                    processed_headers.append(f'<th>{headers[i]}</th>')
-                i = j
-            else:
-                i += 1
-        # Crear la tabla HTML con encabezados procesados
-        html += '<table class="tabla-estructurada">\n'
-        html += '  <thead>\n    <tr>\n'
-        html += '      ' + '\n      '.join(processed_headers) + '\n'
-        html += '    </tr>\n  </thead>\n'
-        # Procesar el cuerpo de la tabla
-        html += '  <tbody>\n'
-        for _, row in df.iloc[1:].iterrows():
-            html += '    <tr>\n'
-            for cell_value in row:
-                if isinstance(cell_value, str) and cell_value.endswith('%'):
-                    html += f'      <td class="percentage-cell">{cell_value}</td>\n'
-                else:
-                    html += f'      <td>{cell_value if cell_value is not None else ""}</td>\n'
-            html += '    </tr>\n'
-        html += '  </tbody>\n</table>\n'
-    else:
-        html += '<p>Tabla vacía</p>\n'
-    html += '</div>\n'
-    return html, end_row - start_row
+    if not filas:
+        return None
+    
+    # Encabezado y, según la regla de formato, la fila que pasa a subencabezado
+    headers = [formatear_celda(*celda) for celda in zip(*filas[0])]
+    filas_tabla = list(filas)
+    subencabezado = None
+    if regla and regla.get('subencabezado'):
+        # Igual que el formato anterior, se exige al menos una fila de cuerpo adicional
+        if len(filas) > regla['subencabezado'] + 1:
+            subencabezado = [formatear_celda(*celda) for celda in zip(*filas.pop(regla['subencabezado']))]
+    
+    # Proyección de columnas: se decide con el encabezado y el subencabezado, antes de
+    # formatear ninguna celda del cuerpo
+    predicados = []
+    if proyeccion is not None:
+        predicados.append(proyeccion)
+    if regla and regla.get('proyeccion') is not None:
+        predicados.append(regla['proyeccion'])
+    if subencabezado is not None and regla.get('eliminar_columnas'):
+        textos = regla['eliminar_columnas']
+        predicados.append(lambda encabezado, sub: not any(texto in sub for texto in textos))
+    columnas = range(len(headers))
+    if predicados:
+        grupos = encabezados_de_grupo(headers)
+        subtextos = subencabezado or [None] * len(headers)
+        columnas = [
+            col_idx for col_idx in columnas
+            if all(predicado(grupos[col_idx], subtextos[col_idx] or '') for predicado in predicados)
+        ]
+    # Eliminar columnas completamente vacías (el subencabezado también cuenta)
+    conservadas = columnas_ocupadas([fila for fila, _ in filas_tabla], columnas)
+    
+    # Procesar encabezados para combinar celdas vacías adyacentes
+    encabezados = []
+    en_tabla = [False] * len(headers)
+    for col_idx in conservadas:
+        en_tabla[col_idx] = True
+    i = 0
+    while i < len(headers):
+        if headers[i] is not None and headers[i] != '':
+            # Contar celdas vacías siguientes
+            j = i + 1
+            while j < len(headers) and (headers[j] is None or headers[j] == ''):
+                j += 1
+            # El colspan cuenta solo las columnas que quedan en la tabla
+            colspan = sum(en_tabla[i:j])
+            if colspan > 0:
+                encabezados.append((headers[i], colspan))
+            i = j
+        else:
+            i += 1
+    return {'filas': filas, 'subencabezado': subencabezado, 'conservadas': conservadas, 'encabezados': encabezados}
+
+def procesar_tabla(hoja, start_row, end_row, regla=None, proyeccion=None):
+    """
+    Procesa la tabla entre las filas start_row y end_row (exclusiva) y devuelve su HTML.
+    Combina celdas de encabezado vacías adyacentes usando colspan.
+    regla es una de las reglas de REGLAS_FORMATO para esta tabla, o None.
+    proyeccion es un predicado proyeccion(encabezado, subencabezado) -> bool sobre los textos
+    de cada columna ('' si no hay); las columnas para las que devuelve False no se formatean
+    ni se escriben. También puede indicarse en la regla con la clave 'proyeccion'.
+    """
+    return ''.join(iterar_html_tabla(hoja, start_row, end_row, regla, proyeccion))
+
+def iterar_html_tabla(hoja, start_row, end_row, regla=None, proyeccion=None, paginador=None, numero_tabla=1):
+    """
+    Igual que procesar_tabla, pero genera el HTML por fragmentos (uno por fila de la tabla)
+    para poder escribirlo directamente en el archivo sin acumular la página en memoria.
+    Con un PaginadorTablas, si la tabla tiene más filas que paginador.filas_por_pagina solo
+    la primera página de filas queda aquí; el resto se escribe en páginas numeradas.
+    """
+    tabla = estructura_tabla(hoja, start_row, end_row, regla, proyeccion)
+    if tabla is None:
+        yield '<div class="tabla-contenedor">\n'
+        yield '<p>Tabla vacía</p>\n'
+        yield '</div>\n'
+        return
+    filas = tabla['filas']
+    subencabezado = tabla['subencabezado']
+    conservadas = tabla['conservadas']
+    processed_headers = [
+        f'<th colspan="{colspan}">{texto}</th>' if colspan > 1 else f'<th>{texto}</th>'
+        for texto, colspan in tabla['encabezados']
+    ]
+    # Crear la tabla HTML con encabezados procesados
+    cabecera = [
+        '<table class="tabla-estructurada">\n',
+        '  <thead>\n    <tr>\n',
+        '      ' + '\n      '.join(processed_headers) + '\n',
+        '    </tr>\n'
+    ]
+    if subencabezado is not None:
+        cabecera.append(html_fila_tabla([subencabezado[col_idx] for col_idx in conservadas], 'subheader'))
+    cabecera.append('  </thead>\n')
+    # Procesar el cuerpo de la tabla (solo se formatean las columnas conservadas)
+    filas_html = iterar_filas_html(islice(filas, 1, None), conservadas)
+    if paginador is not None and paginador.requiere_paginas(len(filas) - 1):
+        yield from paginador.iterar_tabla_paginada(numero_tabla, ''.join(cabecera), filas_html, len(filas) - 1)
+        return
+    yield f'<div class="tabla-contenedor" id="tabla-{numero_tabla}">\n'
+    yield from cabecera
+    yield '  <tbody>\n'
+    yield from filas_html
+    yield '  </tbody>\n</table>\n'
+    yield '</div>\n'
 
 def slugify(texto):
     texto = re.sub(r'[^\w\s-]', '', texto.lower())
     return re.sub(r'[-\s]+', '-', texto).strip('-_')
 
-def generar_html_hoja(ws, sheet_name, nombre_archivo_excel):
-    """Genera el HTML para una hoja específica"""
-    # Procesar celdas combinadas - VERSIÓN CORREGIDA
-    merged_cells = []
-    if ws.merged_cells.ranges:
-        for merged_range in ws.merged_cells.ranges:
-            # Convertir el rango a coordenadas
-            min_col, min_row, max_col, max_row = merged_range.bounds
-            merged_cells.append({
-                'range': merged_range,
-                'value': ws.cell(row=min_row, column=min_col).value,
-                'first_cell': (min_row, min_col),
-                'bounds': (min_row, min_col, max_row, max_col)  # Para fácil verificación
-            })
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset=\"UTF-8\">
-    <title>{sheet_name} - {nombre_archivo_excel}</title>
-    <link rel="stylesheet" href="../css/styles.css">
-    <link rel=\"stylesheet\" href=\"https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.3/css/all.min.css\">
-</head>
-<body>
-    <header>
-        <h1>{sheet_name}</h1>
-        <a href=\"index.html\" class=\"btn-volver\"><i class=\"fas fa-arrow-left\"></i> Volver al índice</a>
-    </header>
-    <div class=\"contenido-hoja\">
-"""
+def leer_rangos_combinados(ws):
+    """
+    Devuelve los rangos combinados de la hoja.
+    Las hojas de solo lectura no exponen merged_cells, así que se recorre el XML de la
+    hoja en streaming y solo se conservan los elementos <mergeCell>.
+    """
+    if not isinstance(ws, ReadOnlyWorksheet):
+        return list(ws.merged_cells.ranges)
+    
+    rangos = []
+    sheet_data = None
+    src = ws._get_source()
+    try:
+        for event, elem in iterparse(src, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == f'{{{SHEET_MAIN_NS}}}sheetData':
+                    sheet_data = elem
+                continue
+            if elem.tag == f'{{{SHEET_MAIN_NS}}}row' and sheet_data is not None:
+                # Descartar las filas ya leídas para no retener la hoja en memoria
+                sheet_data.clear()
+            elif elem.tag == f'{{{SHEET_MAIN_NS}}}mergeCell':
+                rangos.append(CellRange(elem.get('ref')))
+    finally:
+        src.close()
+    return rangos
+
+def indexar_celdas_combinadas(rangos):
+    """
+    Construye un índice (fila, columna) -> rango combinado para la hoja.
+    Cada celda cubierta por un rango apunta al mismo diccionario, de modo que
+    la búsqueda de una celda combinada es O(1) en lugar de recorrer todos los rangos.
+    """
+    merged_cells = {}
+    for merged_range in rangos:
+        # Convertir el rango a coordenadas
+        min_col, min_row, max_col, max_row = merged_range.bounds
+        merged = {
+            'range': merged_range,
+            'first_cell': (min_row, min_col),
+            'bounds': (min_row, min_col, max_row, max_col)  # Para fácil verificación
+        }
+        for row_idx in range(min_row, max_row + 1):
+            for col_idx in range(min_col, max_col + 1):
+                merged_cells[(row_idx, col_idx)] = merged
+    return merged_cells
+
+def cargar_hoja(ws):
+    """
+    Lee una hoja (normal o de solo lectura) y devuelve su cuadrícula con las filas clasificadas.
+    """
+    with instrumentacion.tramo('leer_hoja', hoja=ws.title):
+        merged_cells = indexar_celdas_combinadas(leer_rangos_combinados(ws))
+        hoja = materializar_hoja(ws, merged_cells)
+    with instrumentacion.tramo('clasificar_filas', hoja=ws.title):
+        clasificar_filas(hoja)
+    instrumentacion.contar('filas', hoja['max_row'])
+    instrumentacion.contar('celdas', hoja['max_row'] * hoja['max_column'])
+    instrumentacion.contar('celdas_combinadas', len(merged_cells))
+    return hoja
+
+def obtener_titulo_hoja(hoja):
+    """Devuelve el primer texto no vacío de la hoja, recorriendo por filas."""
+    for fila in hoja['valores']:
+        for cell_value in fila:
+            if cell_value is not None and str(cell_value).strip() != "":
+                return str(cell_value).strip()
+    return None
+
+def generar_html_hoja(ws, sheet_name, nombre_archivo_excel, hoja=None, reglas=None):
+    """
+    Genera el HTML para una hoja específica.
+    Si ya se dispone de la cuadrícula de la hoja (ver cargar_hoja) se puede pasar en hoja
+    para no volver a leerla. reglas es la lista de reglas de formato de la página
+    (ver REGLAS_FORMATO).
+    """
+    return b''.join(iterar_html_hoja(ws, sheet_name, nombre_archivo_excel, hoja=hoja, reglas=reglas)).decode('utf-8')
+
+def inicio_hoja(sheet_name, nombre_archivo_excel, titulo=None):
+    """Bytes de la cabecera de la página de una hoja, hasta la apertura de div.contenido-hoja."""
+    return plantillas.INICIO_HOJA.render(titulo=titulo or sheet_name, libro=nombre_archivo_excel, hoja=sheet_name)
+
+def iterar_html_hoja(ws, sheet_name, nombre_archivo_excel, hoja=None, reglas=None, paginador=None):
+    """
+    Igual que generar_html_hoja, pero genera la página por fragmentos de bytes para
+    escribirla directamente en un archivo binario (ver renderizar_hoja). Con un
+    PaginadorTablas las tablas grandes se reparten en páginas numeradas.
+    """
+    if hoja is None:
+        hoja = cargar_hoja(ws)
+    yield inicio_hoja(sheet_name, nombre_archivo_excel)
     #Procesar filas de la hoja
-    current_row = 1
-    while current_row <= ws.max_row:
-        # Verificar si la fila está vacía
-        row_empty = all(cell.value is None for cell in ws[current_row])
-        if not row_empty:
-            if es_texto_aislado(ws, current_row, merged_cells):
-                html += procesar_texto_aislado(ws, current_row, merged_cells, sheet_name)
-                current_row += 1
-            else:
-                # Procesar tabla
-                table_html, rows_processed = procesar_tabla(ws, current_row, merged_cells)
-                html += table_html
-                current_row += rows_processed
+    reglas_tablas = {regla['tabla']: regla for regla in reglas or []}
+    numero_tabla = 0
+    for tipo, start_row, end_row in segmentar_hoja(hoja):
+        if tipo == 'texto':
+            yield procesar_texto_aislado(hoja, start_row, sheet_name).encode('utf-8')
         else:
-            current_row += 1
-    html += f"""
-    </div>
-    <footer>
-        <div class=\"footer-flex\">
-            <img src="../assets/azul_sdgdtic.png" alt="Logo secretaria de Gobierno Digital y Tecnología de la Información y Comunicaciones">
-            <span>&copy; 2025</span>
-        </div>
-    </footer>
-</body>
-</html>
-"""
-    return html
-
-def generar_indice(indice, carpeta_salida, nombre_archivo_excel):
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset=\"UTF-8\">
-    <title>Indice - {nombre_archivo_excel}</title>
-    <link rel="stylesheet" href="../css/styles.css">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.3/css/all.min.css">
-</head>
-<body>
-    <header><h1>{nombre_archivo_excel}
-    </h1>
-    <a href="../indice.html " class="btn-volver"><i class="fas fa-arrow-left"></i> Volver al índice de Libros</a>
-    </header>
-    <div class=\"contenedor-indice\">
-        <h2>Indice de Contenidos</h2>
-        <ul class=\"lista-indice\">
+            numero_tabla += 1
+            for fragmento in iterar_html_tabla(hoja, start_row, end_row, reglas_tablas.get(numero_tabla),
+                                               paginador=paginador, numero_tabla=numero_tabla):
+                yield fragmento.encode('utf-8')
+    yield plantillas.FIN_HOJA.render()
+
+def nombre_pagina_tabla(nombre_archivo_html, numero_tabla, pagina):
+    """Enlace a una página de una tabla paginada; la primera está en la página de la hoja."""
+    if pagina == 1:
+        return f"{nombre_archivo_html}#tabla-{numero_tabla}"
+    return f"{os.path.splitext(nombre_archivo_html)[0]}-tabla{numero_tabla}-pagina{pagina}.html"
+
+class PaginadorTablas:
+    """
+    Reparte las tablas de más de filas_por_pagina filas de una hoja en páginas numeradas:
+    la página de la hoja muestra la primera página de filas y las demás se escriben en
+    <hoja>-tabla<n>-pagina<k>.html, con el mismo encabezado de tabla y una barra de
+    navegación entre páginas. Así el tamaño de la página de la hoja (y lo que tarda el
+    navegador en mostrarla) no depende del número de filas.
+    En archivos quedan los nombres de las páginas escritas.
+    """
+
+    def __init__(self, carpeta_salida, nombre_archivo_html, sheet_name, nombre_archivo_excel,
+                 filas_por_pagina=FILAS_POR_PAGINA):
+        self.carpeta_salida = carpeta_salida
+        self.nombre_archivo_html = nombre_archivo_html
+        self.sheet_name = sheet_name
+        self.nombre_archivo_excel = nombre_archivo_excel
+        self.filas_por_pagina = filas_por_pagina
+        self.archivos = []
+
+    def requiere_paginas(self, n_filas):
+        return self.filas_por_pagina > 0 and n_filas > self.filas_por_pagina
+
+    def nombre_pagina(self, numero_tabla, pagina):
+        return nombre_pagina_tabla(self.nombre_archivo_html, numero_tabla, pagina)
+
+    def navegacion(self, numero_tabla, pagina, total):
+        enlaces = []
+        if pagina > 1:
+            enlaces.append(f'<a href="{self.nombre_pagina(numero_tabla, pagina - 1)}">&laquo; Anterior</a>')
+        for numero in range(1, total + 1):
+            if numero == pagina:
+                enlaces.append(f'<span class="pagina-actual">{numero}</span>')
+            else:
+                enlaces.append(f'<a href="{self.nombre_pagina(numero_tabla, numero)}">{numero}</a>')
+        if pagina < total:
+            enlaces.append(f'<a href="{self.nombre_pagina(numero_tabla, pagina + 1)}">Siguiente &raquo;</a>')
+        return ('<nav class="paginacion">\n'
+                f'    <span class="paginacion-estado">Página {pagina} de {total}</span>\n'
+                '    ' + '\n    '.join(enlaces) + '\n</nav>\n')
+
+    def iterar_tabla_paginada(self, numero_tabla, cabecera, filas_html, n_filas):
+        """
+        Genera la primera página de la tabla para la página de la hoja y escribe las demás.
+        cabecera es el HTML desde <table> hasta </thead> y filas_html un iterador con el
+        HTML de cada fila del cuerpo.
+        """
+        total = -(-n_filas // self.filas_por_pagina)
+        yield self.navegacion(numero_tabla, 1, total)
+        yield f'<div class="tabla-contenedor" id="tabla-{numero_tabla}">\n'
+        yield cabecera
+        yield '  <tbody>\n'
+        yield from islice(filas_html, self.filas_por_pagina)
+        yield '  </tbody>\n</table>\n'
+        yield '</div>\n'
+        cabecera_bytes = cabecera.encode('utf-8')
+        for pagina in range(2, total + 1):
+            nombre = self.nombre_pagina(numero_tabla, pagina)
+            salida.escribir(os.path.join(self.carpeta_salida, nombre),
+                            self._iterar_pagina(numero_tabla, pagina, total, cabecera_bytes, filas_html))
+            self.archivos.append(nombre)
+
+    def _iterar_pagina(self, numero_tabla, pagina, total, cabecera_bytes, filas_html):
+        """Bytes de la página numerada pagina de la tabla, con sus filas tomadas de filas_html."""
+        titulo = f"{self.sheet_name} (tabla {numero_tabla}, página {pagina} de {total})"
+        yield inicio_hoja(self.sheet_name, self.nombre_archivo_excel, titulo)
+        yield self.navegacion(numero_tabla, pagina, total).encode('utf-8')
+        yield b'<div class="tabla-contenedor">\n'
+        yield cabecera_bytes
+        yield b'  <tbody>\n'
+        for fila in islice(filas_html, self.filas_por_pagina):
+            yield fila.encode('utf-8')
+        yield b'  </tbody>\n</table>\n'
+        yield b'</div>\n'
+        yield plantillas.FIN_HOJA.render()
+
+    def borrar_paginas_obsoletas(self):
+        """Borra las páginas numeradas de esta hoja que quedaron de una generación anterior."""
+        prefijo = f"{os.path.splitext(self.nombre_archivo_html)[0]}-tabla"
+        patron = re.compile(re.escape(prefijo) + r'\d+-pagina\d+\.html$')
+        with os.scandir(self.carpeta_salida) as it:
+            for entrada in it:
+                if patron.match(entrada.name) and entrada.name not in self.archivos:
+                    os.remove(entrada.path)
+
+# Buscador de los índices de libros (ARCHIVO_BUSCADOR). Carga bajo demanda los fragmentos
+# ARCHIVO_BUSQUEDA de cada libro y busca por prefijo todas las palabras de la consulta.
+# Tras cada consulta la lista de resultados emite el evento 'actualizada'.
+BUSCADOR_JS = """// Búsqueda en el índice de los libros (generado por converthtml.py)
+(function () {
+    const MAXIMO_RESULTADOS = 100;
+    const esperando = {};
+    const cargas = {};
+
+    // Cada fragmento busqueda.js llama a esta función al cargarse
+    window.registrarIndiceBusqueda = function (datos) {
+        const resolver = esperando[datos.libro];
+        if (resolver) {
+            delete esperando[datos.libro];
+            resolver(datos);
+        }
+    };
+
+    function cargarIndice(entrada) {
+        if (!cargas[entrada.archivo]) {
+            cargas[entrada.archivo] = new Promise(function (resolve) {
+                esperando[entrada.libro] = resolve;
+                const script = document.createElement('script');
+                script.src = entrada.archivo;
+                script.onerror = function () { resolve(null); };
+                document.head.appendChild(script);
+            });
+        }
+        return cargas[entrada.archivo];
+    }
+
+    // Igual que tokens_busqueda en converthtml.py
+    function normalizar(texto) {
+        const palabras = texto.normalize('NFD').replace(/[\\u0300-\\u036f]/g, '').toLowerCase().match(/[a-z0-9]+/g) || [];
+        return palabras.filter(function (palabra) { return palabra.length > 1 && !/^[0-9]+$/.test(palabra); });
+    }
+
+    // Primera posición de la lista ordenada de tokens que no es menor que el prefijo
+    function primeraPosicion(tokens, prefijo) {
+        let inicio = 0;
+        let fin = tokens.length;
+        while (inicio < fin) {
+            const medio = (inicio + fin) >> 1;
+            if (tokens[medio] < prefijo) {
+                inicio = medio + 1;
+            } else {
+                fin = medio;
+            }
+        }
+        return inicio;
+    }
+
+    // Destinos que contienen alguna palabra que empieza por cada uno de los términos
+    function buscar(datos, terminos) {
+        let resultado = null;
+        for (const termino of terminos) {
+            const encontrados = new Set();
+            for (let i = primeraPosicion(datos.tokens, termino);
+                 i < datos.tokens.length && datos.tokens[i].startsWith(termino); i++) {
+                for (const destino of datos.apariciones[i]) {
+                    encontrados.add(destino);
+                }
+            }
+            resultado = resultado === null ? encontrados
+                : new Set([...resultado].filter(function (destino) { return encontrados.has(destino); }));
+            if (resultado.size === 0) {
+                break;
+            }
+        }
+        return resultado === null ? [] : [...resultado].sort(function (a, b) { return a - b; });
+    }
+
+    window.iniciarBuscador = function (config) {
+        const entrada = document.getElementById(config.entrada);
+        const lista = document.getElementById(config.resultados);
+        let consulta = 0;
+
+        async function actualizar() {
+            const terminos = normalizar(entrada.value);
+            const numero = ++consulta;
+            if (terminos.length === 0) {
+                lista.innerHTML = '';
+                lista.style.display = 'none';
+                lista.dispatchEvent(new Event('actualizada'));
+                return;
+            }
+            // Solo se cargan los libros que tienen palabras con esas dos primeras letras
+            const candidatos = config.indices.filter(function (indice) {
+                return !indice.prefijos || terminos.every(function (termino) {
+                    return indice.prefijos.indexOf(termino.slice(0, 2)) > -1;
+                });
+            });
+            const fragmentos = await Promise.all(candidatos.map(cargarIndice));
+            if (numero !== consulta) {
+                return;  // Llegó otra consulta mientras se cargaban los fragmentos
+            }
+            lista.innerHTML = '';
+            let total = 0;
+            fragmentos.forEach(function (datos, posicion) {
+                if (!datos) {
+                    return;
+                }
+                for (const destino of buscar(datos, terminos)) {
+                    if (total >= MAXIMO_RESULTADOS) {
+                        return;
+                    }
+                    const [hoja, enlace, etiqueta] = datos.destinos[destino];
+                    const titulo = datos.hojas[hoja][1] || datos.hojas[hoja][0].replace(/\\.html$/, '');
+                    const a = document.createElement('a');
+                    a.href = candidatos[posicion].base + enlace;
+                    a.textContent = (config.mostrarLibro ? datos.libro + ' › ' : '') + titulo +
+                        (etiqueta && etiqueta !== titulo ? ' — ' + etiqueta : '');
+                    const li = document.createElement('li');
+                    li.appendChild(a);
+                    lista.appendChild(li);
+                    total++;
+                }
+            });
+            lista.style.display = total > 0 ? '' : 'none';
+            lista.dispatchEvent(new Event('actualizada'));
+        }
+
+        entrada.addEventListener('input', actualizar);
+    };
+})();
 """
+
+def guardar_buscador(carpeta_salida):
+    salida.escribir(os.path.join(carpeta_salida, ARCHIVO_BUSCADOR), BUSCADOR_JS.encode('utf-8'))
+
+def config_buscador(indices, mostrar_libro):
+    """JSON con el que se inicia el buscador: la lista de fragmentos de índice que puede cargar."""
+    config = {
+        'entrada': 'buscador-input',
+        'resultados': 'resultados-busqueda',
+        'mostrarLibro': mostrar_libro,
+        'indices': indices
+    }
+    # Evita que un nombre con "</script>" cierre la etiqueta
+    return json.dumps(config, ensure_ascii=False).replace('</', '<\\/')
+
+def generar_indice(indice, carpeta_salida, nombre_archivo_excel, carpeta_sitio=None):
+    """
+    Guarda el índice del libro. Su buscador es el de la raíz del sitio (la carpeta del índice
+    general): si se indica carpeta_sitio se guarda allí y se enlaza con la ruta relativa; si
+    no, se enlaza el de la carpeta superior, que guarda generar_indice_general.
+    """
+    buscador = f"../{ARCHIVO_BUSCADOR}"
+    if carpeta_sitio is not None:
+        guardar_buscador(carpeta_sitio)
+        buscador = os.path.relpath(os.path.join(carpeta_sitio, ARCHIVO_BUSCADOR), carpeta_salida).replace(os.sep, '/')
+    salida.escribir(os.path.join(carpeta_salida, 'index.html'),
+                    iterar_html_indice(indice, nombre_archivo_excel, buscador))
+
+def iterar_html_indice(indice, nombre_archivo_excel, buscador=f"../{ARCHIVO_BUSCADOR}"):
+    """Genera por fragmentos de bytes el HTML del índice de un libro; buscador es la ruta de buscador.js."""
+    yield plantillas.INICIO_INDICE_LIBRO.render(libro=nombre_archivo_excel)
     for item in indice:
-        html += f'<li><a href="{item["archivo"]}"><i class="fas fa-file-alt"></i> {item["nombre"]}</a></li>\n'
-   
-    html += f"""        </ul>
-        </div>
-        <footer>
-            <div class="footer-flex">
-                <img src="../assets/azul_sdgdtic.png" alt="Logo secretaria de Gobierno Digital y Tecnología de la Información y Comunicaciones">
-                <span>&copy; 2025</span>
-            </div>
-        </footer>
-    </body>
-    </html>
-    """
-    # Guardar archivos
-    with open(os.path.join(carpeta_salida, 'index.html'), 'w', encoding='utf-8') as f:
-        f.write(html)
-
-def excel_a_html_multiple(nombre_base, contenido_excel, carpeta_salida='html_output'):  # <-- Ahora recibe 2 parámetros
-    if contenido_excel is None:
-        return []
-    
-    wb = load_workbook(contenido_excel, data_only=True)
-    os.makedirs(carpeta_salida, exist_ok=True)
-    
-    # Obtener el nombre del archivo desde .env
-    nombre_archivo = nombre_base
-    if not nombre_archivo:
-        raise ValueError("La variable SHAREPOINT_FILE no está definida en .env")
+        yield plantillas.ELEMENTO_INDICE_LIBRO.render(archivo=item['archivo'], nombre=item['nombre'])
+    yield plantillas.FIN_INDICE_LIBRO.render(
+        buscador=buscador,
+        config_buscador=config_buscador(
+            [{'libro': nombre_archivo_excel, 'archivo': ARCHIVO_BUSQUEDA, 'base': '', 'prefijos': None}], False
+        )
+    )
+
+def hoja_seleccionada(sheet_name, incluir=None, excluir=None):
+    """
+    Indica si una hoja debe convertirse según los patrones de inclusión y exclusión.
+    Los patrones son de tipo fnmatch y se comparan con el nombre en minúsculas.
+    """
+    nombre = sheet_name.strip().lower()
+    if incluir is not None and not any(fnmatchcase(nombre, patron.lower()) for patron in incluir):
+        return False
+    if excluir and any(fnmatchcase(nombre, patron.lower()) for patron in excluir):
+        return False
+    return True
+
+def listar_partes_hojas(archivo):
+    """
+    Devuelve [(nombre_hoja, ruta_xml)] en el orden del libro leyendo solo workbook.xml
+    y sus relaciones, sin parsear ninguna hoja.
+    """
+    rels_paquete = get_dependents(archivo, '_rels/.rels')
+    workbook_part = next(
+        rel.target for rel in rels_paquete.Relationship if rel.Type.endswith('/officeDocument')
+    )
+    rels_libro = get_dependents(archivo, get_rels_path(workbook_part))
+    raiz = fromstring(archivo.read(workbook_part))
+    partes = []
+    for sheet in raiz.iter(f'{{{SHEET_MAIN_NS}}}sheet'):
+        rel_id = sheet.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id')
+        partes.append((sheet.get('name'), rels_libro[rel_id].target))
+    return partes
+
+def _leer_cadenas_y_formatos(archivo):
+    """
+    Lee de un xlsx abierto como ZipFile las cadenas compartidas (lista de textos) y, por
+    índice de estilo de celda, su formato numérico (id y código), que es lo único de los
+    estilos que afecta al HTML.
+    """
+    cadenas = []
+    if 'xl/sharedStrings.xml' in archivo.namelist():
+        with archivo.open('xl/sharedStrings.xml') as src:
+            for _, elem in iterparse(src):
+                if elem.tag == f'{{{SHEET_MAIN_NS}}}si':
+                    cadenas.append(''.join(elem.itertext()))
+                    elem.clear()
+    formatos = []
+    if 'xl/styles.xml' in archivo.namelist():
+        raiz = fromstring(archivo.read('xl/styles.xml'))
+        codigos = {
+            numfmt.get('numFmtId'): numfmt.get('formatCode')
+            for numfmt in raiz.iter(f'{{{SHEET_MAIN_NS}}}numFmt')
+        }
+        cell_xfs = raiz.find(f'{{{SHEET_MAIN_NS}}}cellXfs')
+        for xf in cell_xfs if cell_xfs is not None else ():
+            id_formato = xf.get('numFmtId', '0')
+            formatos.append((id_formato, codigos.get(id_formato)))
+    return cadenas, formatos
+
+def calcular_huellas_hojas(contenido_excel, reglas=None, filas_por_pagina=FILAS_POR_PAGINA):
+    """
+    Calcula una huella SHA-256 por hoja a partir de su parte XML dentro del xlsx, de las
+    cadenas compartidas y los formatos numéricos que usan sus celdas (no de todo
+    sharedStrings.xml y styles.xml, que cambian al editar cualquier hoja), de la versión
+    del conversor, de las reglas de formato de la hoja y de filas_por_pagina (ver
+    configuracion_render): cambiar cualquiera de ellos obliga a regenerar la hoja.
+    Devuelve un diccionario {nombre_hoja: huella} en el orden del libro.
+    """
+    huellas = {}
+    with ZipFile(contenido_excel) as archivo:
+        cadenas, formatos = _leer_cadenas_y_formatos(archivo)
+        for sheet_name, ruta in listar_partes_hojas(archivo):
+            huella = hashlib.sha256()
+            usadas = set()
+            estilos = set()
+            # La parte se lee una sola vez: se resume y se analiza a la vez
+            parser = XMLPullParser(events=('start', 'end'))
+            sheet_data = None
+            with archivo.open(ruta) as src:
+                for bloque in iter(lambda: src.read(1 << 20), b''):
+                    huella.update(bloque)
+                    parser.feed(bloque)
+                    for evento, elem in parser.read_events():
+                        if evento == 'start':
+                            if elem.tag == f'{{{SHEET_MAIN_NS}}}sheetData':
+                                sheet_data = elem
+                        elif elem.tag == f'{{{SHEET_MAIN_NS}}}c':
+                            if elem.get('s'):
+                                estilos.add(int(elem.get('s')))
+                            valor = elem.find(f'{{{SHEET_MAIN_NS}}}v')
+                            if elem.get('t') == 's' and valor is not None and valor.text:
+                                usadas.add(int(valor.text))
+                        elif elem.tag == f'{{{SHEET_MAIN_NS}}}row' and sheet_data is not None:
+                            sheet_data.clear()
+            parser.close()
+            for indice in sorted(usadas):
+                huella.update(repr((indice, cadenas[indice] if indice < len(cadenas) else None)).encode('utf-8'))
+            for indice in sorted(estilos):
+                huella.update(repr((indice, formatos[indice] if indice < len(formatos) else None)).encode('utf-8'))
+            reglas_hoja = (reglas or {}).get(f"{slugify(sheet_name)}.html")
+            huella.update(configuracion_render(reglas_hoja, filas_por_pagina).encode('utf-8'))
+            huellas[sheet_name] = huella.hexdigest()
+    return huellas
+
+def leer_huellas(carpeta_salida):
+    """Lee las huellas guardadas en la ejecución anterior, o {} si no existen."""
+    try:
+        with open(os.path.join(carpeta_salida, ARCHIVO_HUELLAS), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_huellas(carpeta_salida, huellas):
+    salida.escribir(os.path.join(carpeta_salida, ARCHIVO_HUELLAS),
+                    json.dumps(huellas, ensure_ascii=False, indent=2).encode('utf-8'))
+
+@lru_cache(maxsize=65536)
+def tokens_busqueda(texto):
+    """
+    Normaliza un texto para el índice de búsqueda: minúsculas, sin tildes y partido en
+    palabras alfanuméricas. Se descartan las palabras de una letra y los números sueltos.
+    El buscador (BUSCADOR_JS) normaliza las consultas de la misma forma.
+    """
+    sin_tildes = ''.join(
+        caracter for caracter in unicodedata.normalize('NFD', texto.lower())
+        if not unicodedata.combining(caracter)
+    )
+    return tuple(
+        token for token in re.findall(r'[a-z0-9]+', sin_tildes)
+        if len(token) > 1 and not token.isdigit()
+    )
+
+def indexar_hoja_para_busqueda(hoja, nombre_archivo_html, titulo_hoja, reglas_hoja=None,
+                               filas_por_pagina=FILAS_POR_PAGINA):
+    """
+    Recoge las palabras del título, de los textos y de las celdas de texto de las columnas
+    publicadas de las tablas de una hoja (ver estructura_tabla). Devuelve
+    {'destinos': [[enlace, etiqueta], ...], 'tokens': {token: [destino, ...]}}, donde el destino 0 es la página de la hoja y cada tabla (o página de una tabla paginada)
+    tiene el suyo, con el mismo reparto de filas que iterar_html_tabla y PaginadorTablas.
+    """
+    destinos = [[nombre_archivo_html, titulo_hoja or '']]
+    tokens = {}
     
-    nombre_archivo_excel = os.path.splitext(nombre_archivo)[0]
-    print(f"Procesando archivo: {nombre_archivo_excel}")
+    def agregar(cell_value, destino):
+        if isinstance(cell_value, str):
+            for token in tokens_busqueda(cell_value):
+                tokens.setdefault(token, set()).add(destino)
     
-    indice = []
-    for sheet_name in wb.sheetnames:
-        if sheet_name.strip().lower() in ["índice", "datoscbox"]:
+    if titulo_hoja:
+        agregar(titulo_hoja, 0)
+    reglas_tablas = {regla['tabla']: regla for regla in reglas_hoja or []}
+    numero_tabla = 0
+    for tipo, start_row, end_row in segmentar_hoja(hoja):
+        if tipo == 'texto':
+            for cell_value in hoja['valores'][start_row - 1]:
+                agregar(cell_value, 0)
             continue
+        numero_tabla += 1
+        # Solo se indexa lo que publica iterar_html_tabla: nunca las columnas eliminadas
+        tabla = estructura_tabla(hoja, start_row, end_row, reglas_tablas.get(numero_tabla))
+        if tabla is None:
+            continue
+        conservadas = tabla['conservadas']
+        destino_tabla = len(destinos)
+        destinos.append([nombre_pagina_tabla(nombre_archivo_html, numero_tabla, 1), f"Tabla {numero_tabla}"])
+        for texto, _ in tabla['encabezados']:
+            agregar(texto, destino_tabla)
+        if tabla['subencabezado'] is not None:
+            for col_idx in conservadas:
+                agregar(tabla['subencabezado'][col_idx], destino_tabla)
         
-        ws = wb[sheet_name]
-        titulo_hoja = None
+        filas = tabla['filas']
+        paginada = filas_por_pagina > 0 and len(filas) - 1 > filas_por_pagina
+        destino = destino_tabla
+        for posicion, (fila, _) in enumerate(islice(filas, 1, None)):
+            if paginada and posicion % filas_por_pagina == 0 and posicion > 0:
+                pagina = posicion // filas_por_pagina + 1
+                destino = len(destinos)
+                destinos.append([nombre_pagina_tabla(nombre_archivo_html, numero_tabla, pagina),
+                                 f"Tabla {numero_tabla}, página {pagina}"])
+            for col_idx in conservadas:
+                agregar(fila[col_idx], destino)
+    return {'destinos': destinos, 'tokens': {token: sorted(ids) for token, ids in tokens.items()}}
+
+def guardar_indice_busqueda(carpeta_salida, nombre_archivo_excel, hojas):
+    """
+    Escribe el fragmento del índice de búsqueda del libro (ARCHIVO_BUSQUEDA).
+    hojas es una lista de (archivo_html, título, resultado de indexar_hoja_para_busqueda)
+    en el orden del índice. Los tokens van ordenados para que el buscador encuentre los
+    prefijos con una búsqueda binaria, y 'prefijos' resume sus dos primeras letras para
+    que el índice general solo cargue los libros que pueden contener la consulta.
+    Se escribe como un script que llama a registrarIndiceBusqueda para poder cargarlo con
+    una etiqueta <script>, también cuando el sitio se abre desde el disco (file://).
+    """
+    destinos = []
+    tokens = {}
+    for numero_hoja, (archivo_html, titulo, busqueda) in enumerate(hojas):
+        desplazamiento = len(destinos)
+        destinos.extend([numero_hoja, enlace, etiqueta] for enlace, etiqueta in busqueda['destinos'])
+        for token, ids in busqueda['tokens'].items():
+            tokens.setdefault(token, []).extend(desplazamiento + destino for destino in ids)
+    orden = sorted(tokens)
+    datos = {
+        'libro': nombre_archivo_excel,
+        'hojas': [[archivo_html, titulo] for archivo_html, titulo, _ in hojas],
+        'destinos': destinos,
+        'prefijos': sorted({token[:2] for token in orden}),
+        'tokens': orden,
+        'apariciones': [tokens[token] for token in orden]
+    }
+    ruta = os.path.join(carpeta_salida, ARCHIVO_BUSQUEDA)
+    salida.escribir(ruta, f"registrarIndiceBusqueda({json.dumps(datos, ensure_ascii=False, separators=(',', ':'))});\n"
+                    .encode('utf-8'))
+
+def leer_indice_busqueda(carpeta_salida):
+    """Lee el fragmento del índice de búsqueda de un libro, o None si no existe."""
+    try:
+        with open(os.path.join(carpeta_salida, ARCHIVO_BUSQUEDA), 'r', encoding='utf-8') as f:
+            contenido = f.read()
+        return json.loads(contenido[contenido.index('(') + 1:contenido.rindex(')')])
+    except (OSError, ValueError):
+        return None
+
+def busqueda_por_hoja(datos):
+    """
+    Separa un fragmento leído con leer_indice_busqueda en el resultado de
+    indexar_hoja_para_busqueda de cada hoja, indexado por archivo HTML. Sirve para
+    conservar las hojas que no se regeneran en una ejecución incremental.
+    """
+    if not datos:
+        return {}
+    por_hoja = {}
+    locales = {}
+    for posicion, (numero_hoja, enlace, etiqueta) in enumerate(datos['destinos']):
+        busqueda = por_hoja.setdefault(datos['hojas'][numero_hoja][0], {'destinos': [], 'tokens': {}})
+        locales[posicion] = (busqueda, len(busqueda['destinos']))
+        busqueda['destinos'].append([enlace, etiqueta])
+    for token, ids in zip(datos['tokens'], datos['apariciones']):
+        for destino in ids:
+            busqueda, local = locales[destino]
+            busqueda['tokens'].setdefault(token, []).append(local)
+    return por_hoja
+
+def renderizar_hoja(ws, nombre_archivo_excel, carpeta_salida, reglas=None, cache=None,
+                    filas_por_pagina=FILAS_POR_PAGINA):
+    """
+    Genera y guarda el HTML de una hoja.
+    reglas es un diccionario como REGLAS_FORMATO, indexado por el nombre del archivo HTML.
+    Con una CacheRender en cache, si la hoja ya se generó con el mismo contenido se copia
+    la página guardada en lugar de volver a generarla.
+    Las tablas de más de filas_por_pagina filas se reparten en páginas (ver PaginadorTablas);
+    esas hojas no se guardan en la caché, que solo guarda la página principal.
+    Devuelve (título, índice de búsqueda de la hoja) (ver indexar_hoja_para_busqueda).
+    """
+    with instrumentacion.tramo('hoja', libro=nombre_archivo_excel, hoja=ws.title):
+        hoja = cargar_hoja(ws)
+        titulo_hoja = obtener_titulo_hoja(hoja)
+        nombre_archivo_html = f"{slugify(ws.title)}.html"
+        reglas_hoja = (reglas or {}).get(nombre_archivo_html)
         
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row):
-            for cell in row:
-                if cell.value is not None and str(cell.value).strip() != "":
-                    titulo_hoja = str(cell.value).strip()
-                    break
-            if titulo_hoja is not None:
+        ruta_html = os.path.join(carpeta_salida, nombre_archivo_html)
+        paginador = PaginadorTablas(carpeta_salida, nombre_archivo_html, titulo_hoja, nombre_archivo_excel,
+                                    filas_por_pagina)
+        clave = None
+        if cache is not None:
+            clave = cache.clave(hoja, ws.title, nombre_archivo_excel, reglas_hoja, filas_por_pagina)
+        if clave is not None and cache.obtener(clave, ruta_html):
+            instrumentacion.contar('cache_aciertos')
+        else:
+            # La página se escribe por fragmentos a medida que se genera
+            with instrumentacion.tramo('generar_y_escribir', hoja=ws.title):
+                salida.escribir(ruta_html, iterar_html_hoja(ws, titulo_hoja, nombre_archivo_excel, hoja=hoja,
+                                                            reglas=reglas_hoja, paginador=paginador))
+            if clave is not None and not paginador.archivos:
+                cache.guardar(clave, ruta_html)
+                instrumentacion.contar('cache_fallos')
+        paginador.borrar_paginas_obsoletas()
+        with instrumentacion.tramo('indexar_busqueda', hoja=ws.title):
+            busqueda = indexar_hoja_para_busqueda(hoja, nombre_archivo_html, titulo_hoja, reglas_hoja,
+                                                  filas_por_pagina)
+    return titulo_hoja, busqueda
+
+def _version_convertidor():
+    # Cualquier cambio en el código o en las plantillas invalida la caché de páginas
+    h = hashlib.sha256()
+    for modulo in (__file__, plantillas.__file__):
+        with open(modulo, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+VERSION_CONVERTIDOR = _version_convertidor()
+
+def configuracion_render(reglas_hoja=None, filas_por_pagina=0):
+    """
+    Texto que identifica todo lo que, además del contenido de la hoja, determina su HTML:
+    la versión del conversor, las reglas de formato de la hoja y filas_por_pagina. Forma
+    parte de las claves de CacheRender y de las huellas de calcular_huellas_hojas.
+    """
+    reglas = json.dumps(reglas_hoja, sort_keys=True, ensure_ascii=False, default=_describir_predicado)
+    return repr((VERSION_CONVERTIDOR, reglas, filas_por_pagina))
+
+def _describir_predicado(valor, vistos=None):
+    """
+    Describe un predicado de las reglas (p. ej. 'proyeccion') por su código, sus constantes,
+    sus valores por defecto y los valores que usa (capturados o globales), no por su nombre:
+    todas las lambdas se llaman '<lambda>' y un predicado definido en el cuaderno puede
+    cambiar sin que cambie VERSION_CONVERTIDOR.
+    """
+    vistos = vistos or set()
+    if hasattr(valor, 'co_code'):
+        constantes = [_describir_predicado(constante, vistos) for constante in valor.co_consts]
+        return repr((valor.co_code, valor.co_names, constantes))
+    if hasattr(valor, '__code__'):
+        if id(valor) in vistos:
+            return repr(valor.__qualname__)  # Funciones recursivas
+        vistos = vistos | {id(valor)}
+        capturados = [_describir_predicado(celda.cell_contents, vistos) for celda in valor.__closure__ or ()]
+        defectos = [_describir_predicado(defecto, vistos) for defecto in valor.__defaults__ or ()]
+        globales = [
+            (nombre, _describir_predicado(valor.__globals__[nombre], vistos))
+            for nombre in valor.__code__.co_names
+            if nombre in valor.__globals__ and not isinstance(valor.__globals__[nombre], type(os))
+        ]
+        return repr((_describir_predicado(valor.__code__, vistos), defectos, capturados, globales))
+    if isinstance(valor, (tuple, list)):
+        return repr([_describir_predicado(elemento, vistos) for elemento in valor])
+    if isinstance(valor, (set, frozenset)):
+        return repr(sorted(_describir_predicado(elemento, vistos) for elemento in valor))
+    return repr(valor)
+
+class CacheRender:
+    """
+    Caché en disco del HTML de las hojas, direccionada por contenido. La clave es un hash de
+    la cuadrícula de la hoja (valores con las celdas combinadas ya resueltas y las marcas de
+    formato de porcentaje), del título, del libro, de las reglas de formato y de la versión
+    del conversor, así que una hoja sin cambios dentro de un libro modificado reutiliza su
+    página. Si la caché supera tamano_maximo bytes se borran las entradas usadas hace más
+    tiempo (la fecha de modificación de cada entrada se renueva al usarla).
+    Solo guarda la ruta y el tamaño, así que se puede pasar a otros procesos.
+    """
+
+    def __init__(self, carpeta, tamano_maximo=TAMANO_MAXIMO_CACHE):
+        self.carpeta = carpeta
+        self.tamano_maximo = tamano_maximo
+
+    def clave(self, hoja, sheet_name, nombre_archivo_excel, reglas_hoja=None, filas_por_pagina=0):
+        h = hashlib.sha256()
+        h.update(repr((configuracion_render(reglas_hoja, filas_por_pagina), sheet_name, nombre_archivo_excel))
+                 .encode('utf-8'))
+        for fila, porcentajes in zip(hoja['valores'], hoja['porcentajes']):
+            h.update(repr(fila).encode('utf-8', 'surrogatepass'))
+            h.update(repr(porcentajes).encode('ascii'))
+        return h.hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, f"{clave}.html")
+
+    def obtener(self, clave, destino):
+        """Copia la página guardada con esa clave en destino; devuelve False si no está."""
+        ruta = self._ruta(clave)
+        try:
+            salida.copiar(ruta, destino)
+            os.utime(ruta)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def guardar(self, clave, origen):
+        """Guarda una copia de la página origen con esa clave y recorta la caché si hace falta."""
+        os.makedirs(self.carpeta, exist_ok=True)
+        temporal = os.path.join(self.carpeta, f"{clave}.{os.getpid()}.tmp")
+        shutil.copyfile(origen, temporal)
+        os.replace(temporal, self._ruta(clave))
+        self.recortar()
+
+    def recortar(self):
+        """Borra las entradas menos usadas recientemente hasta quedar en tamano_maximo."""
+        entradas = []
+        total = 0
+        with os.scandir(self.carpeta) as it:
+            for entrada in it:
+                if not entrada.name.endswith('.html'):
+                    continue
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+        if total <= self.tamano_maximo:
+            return
+        for _, tamano, ruta in sorted(entradas):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+            if total <= self.tamano_maximo:
                 break
-        
-        nombre_archivo_html = f"{slugify(sheet_name)}.html"
-        indice.append({'nombre': titulo_hoja, 'archivo': nombre_archivo_html})
-        
-        html = generar_html_hoja(ws, titulo_hoja, nombre_archivo_excel)
-        
-        with open(os.path.join(carpeta_salida, nombre_archivo_html), 'w', encoding='utf-8') as f:
-            f.write(html)
-    
-    generar_indice(indice, carpeta_salida, nombre_archivo_excel)
-    return indice
 
+# Libro abierto en solo lectura por cada proceso del pool de hojas
+_libro_trabajador = None
 
-def generar_indice_general(indice, carpeta_salida='html_output'):
+def _iniciar_trabajador_hojas(datos_excel):
+    global _libro_trabajador
+    if isinstance(datos_excel, bytes):
+        datos_excel = BytesIO(datos_excel)
+    _libro_trabajador = load_workbook(datos_excel, data_only=True, read_only=True)
+
+def _renderizar_hoja_trabajador(sheet_name, nombre_archivo_excel, carpeta_salida, reglas, cache, filas_por_pagina,
+                                instrumentar):
+    return instrumentacion.ejecutar_en_proceso(
+        renderizar_hoja, instrumentar, _libro_trabajador[sheet_name],
+        nombre_archivo_excel, carpeta_salida, reglas, cache, filas_por_pagina
+    )
+
+def renderizar_hojas_en_paralelo(contenido_excel, nombres_hojas, nombre_archivo_excel, carpeta_salida,
+                                 procesos_hojas, reglas=None, cache=None, filas_por_pagina=FILAS_POR_PAGINA):
+    """
+    Reparte las hojas entre procesos_hojas procesos. Cada proceso abre el libro una vez en
+    modo de solo lectura y genera las hojas que le tocan. Los procesos se crean con spawn,
+    así que un script que lo use debe protegerse con if __name__ == '__main__'.
+    Devuelve {nombre_hoja: (título, índice de búsqueda)}, como renderizar_hoja.
+    """
+    if isinstance(contenido_excel, (str, os.PathLike, SegmentoArchivo)):
+        # Los procesos abren el archivo por su ruta
+        datos_excel = contenido_excel
+    else:
+        contenido_excel.seek(0)
+        datos_excel = contenido_excel.read()
+    
+    # spawn, como el pool de conversión de procesar_todos_los_excel: no se hereda ningún lock tomado
+    with ProcessPoolExecutor(max_workers=procesos_hojas, initializer=_iniciar_trabajador_hojas,
+                             initargs=(datos_excel,), mp_context=multiprocessing.get_context('spawn')) as pool:
+        titulos = pool.map(
+            _renderizar_hoja_trabajador,
+            nombres_hojas,
+            [nombre_archivo_excel] * len(nombres_hojas),
+            [carpeta_salida] * len(nombres_hojas),
+            [reglas] * len(nombres_hojas),
+            [cache] * len(nombres_hojas),
+            [filas_por_pagina] * len(nombres_hojas),
+            [instrumentacion.activa()] * len(nombres_hojas)
+        )
+        resultado = {}
+        for sheet_name, (renderizada, registro) in zip(nombres_hojas, titulos):
+            instrumentacion.incorporar(registro)
+            resultado[sheet_name] = renderizada
+        return resultado
 
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Libros de Dominios</title>
-    <link rel="stylesheet" href="css/styles.css">
-</head>
-
-<body>
-    <header>
-        <h1>Libros de Dominios</h1>
-    </header>
+def excel_a_html_multiple(nombre_base, contenido_excel, carpeta_salida='html_output', streaming=False,
+                          incluir=None, excluir=HOJAS_EXCLUIDAS, incremental=False, procesos_hojas=0,
+                          reglas=REGLAS_FORMATO, cache=None,
+                          filas_por_pagina=FILAS_POR_PAGINA, carpeta_sitio=None):  # <-- Ahora recibe 2 parámetros
+    """
+    Convierte cada hoja del libro en una página HTML y genera el índice del libro.
+    Con streaming=True el libro se abre en modo de solo lectura y las hojas se leen y
+    procesan de una en una, de modo que la memoria queda acotada por la hoja más grande.
+    incluir/excluir son listas de patrones fnmatch sobre el nombre de la hoja.
+    Con incremental=True las hojas cuya huella coincide con la de la ejecución anterior
+    no se vuelven a generar y se conserva su HTML existente.
+    Con procesos_hojas > 0 las hojas se generan en paralelo en ese número de procesos;
+    con 0 (por defecto) se generan en serie en el propio proceso.
+    reglas son las reglas de formato por página (REGLAS_FORMATO por defecto; None para no
+    aplicar ninguna).
+    contenido_excel puede ser un archivo binario abierto (p. ej. un BytesIO) o la ruta del
+    .xlsx; con una ruta el libro se lee directamente del disco sin cargarlo entero en memoria.
+    cache es una CacheRender opcional para reutilizar las páginas de hojas sin cambios.
+    Las tablas de más de filas_por_pagina filas se reparten en páginas numeradas (0 = nunca).
+    carpeta_sitio es la raíz del sitio, donde se guarda el buscador del índice del libro;
+    con None se enlaza el de la carpeta superior, que guarda generar_indice_general.
+    """
+    if contenido_excel is None:
+        return []
     
-    <div class="contenedor-indice">
-        <h2>Índice de Contenidos</h2>
+    with instrumentacion.tramo('libro', libro=nombre_base):
+        os.makedirs(carpeta_salida, exist_ok=True)
         
-        <!-- Buscador añadido aquí -->
-        <div class="buscador">
-            <input type="text" id="buscador-input" placeholder="Buscar libro por nombre...">
-        </div>
+        # Obtener el nombre del archivo desde .env
+        nombre_archivo = nombre_base
+        if not nombre_archivo:
+            raise ValueError("La variable SHAREPOINT_FILE no está definida en .env")
         
-        <ul class="lista-indice" id="lista-libros">
-"""
-    for item in indice:
-        html += f'<li><a href="{item["archivo"]}">{item["nombre"]}</a></li>\n'
-    
-    html += f"""        </ul>
-           <div class="sin-resultados" id="sin-resultados">
-            No se encontraron libros que coincidan con la búsqueda.
-        </div>
-    </div>
-    
-    <footer>
-        <div class="footer-flex">
-            <img src="assets/azul_sdgdtic.png" alt="Logo secretaria de Gobierno Digital y Tecnología de la Información y Comunicaciones">
-            <span>&copy; 2025</span>
-        </div>
-    </footer>
-  """
-    html += """  
-    <script>
-        document.addEventListener('DOMContentLoaded', function() {
-            const buscadorInput = document.getElementById('buscador-input');
-            const lista = document.getElementById('lista-libros');
-            const items = lista.getElementsByTagName('li');
-            const sinResultados = document.getElementById('sin-resultados');
-            
-            // Función para filtrar los libros
-            function filtrarLibros() {
-                const texto = buscadorInput.value.toLowerCase();
-                let resultados = 0;
-                
-                // Recorrer todos los elementos de la lista
-                for (let i = 0; i < items.length; i++) {
-                    const textoItem = items[i].textContent || items[i].innerText;
-                    
-                    // Mostrar u ocultar elementos según coincidan con la búsqueda
-                    if (textoItem.toLowerCase().indexOf(texto) > -1) {
-                        items[i].style.display = "";
-                        resultados++;
-                    } else {
-                        items[i].style.display = "none";
-                    }
-                }
-                
-                // Mostrar mensaje si no hay resultados
-                if (resultados === 0) {
-                    sinResultados.style.display = "block";
-                } else {
-                    sinResultados.style.display = "none";
-                }
-            }
+        nombre_archivo_excel = os.path.splitext(nombre_archivo)[0]
+        print(f"Procesando archivo: {nombre_archivo_excel}")
+        
+        wb = None
+        if incremental:
+            # Las huellas se calculan sobre el zip, antes de cargar ninguna hoja
+            with instrumentacion.tramo('huellas', libro=nombre_archivo_excel):
+                huellas = calcular_huellas_hojas(contenido_excel, reglas, filas_por_pagina)
+            huellas_previas = leer_huellas(carpeta_salida)
+            nombres_hojas = list(huellas)
+        else:
+            huellas = {}
+            huellas_previas = {}
+            if procesos_hojas > 0:
+                # Los procesos abren el libro por su cuenta; aquí basta con los nombres
+                with ZipFile(contenido_excel) as archivo:
+                    nombres_hojas = [sheet_name for sheet_name, _ in listar_partes_hojas(archivo)]
+            else:
+                with instrumentacion.tramo('load_workbook', libro=nombre_archivo_excel):
+                    wb = load_workbook(contenido_excel, data_only=True, read_only=streaming)
+                nombres_hojas = wb.sheetnames
+        
+        seleccionadas = []
+        conservadas = {}
+        pendientes = []
+        for sheet_name in nombres_hojas:
+            if not hoja_seleccionada(sheet_name, incluir, excluir):
+                continue
+            seleccionadas.append(sheet_name)
             
-            // Escuchar el evento de entrada en el buscador
-            buscadorInput.addEventListener('input', filtrarLibros);
+            previa = huellas_previas.get(sheet_name)
+            if (previa and previa['huella'] == huellas.get(sheet_name) and
+                    os.path.exists(os.path.join(carpeta_salida, previa['archivo']))):
+                print(f"Hoja sin cambios, se conserva: {previa['archivo']}")
+                conservadas[sheet_name] = previa
+            else:
+                pendientes.append(sheet_name)
+        
+        if procesos_hojas > 0 and pendientes:
+            renderizadas = renderizar_hojas_en_paralelo(
+                contenido_excel, pendientes, nombre_archivo_excel, carpeta_salida, procesos_hojas, reglas, cache,
+                filas_por_pagina
+            )
+        else:
+            renderizadas = {}
+            for sheet_name in pendientes:
+                if wb is None:
+                    with instrumentacion.tramo('load_workbook', libro=nombre_archivo_excel):
+                        wb = load_workbook(contenido_excel, data_only=True, read_only=streaming)
+                renderizadas[sheet_name] = renderizar_hoja(wb[sheet_name], nombre_archivo_excel, carpeta_salida,
+                                                           reglas, cache, filas_por_pagina)
+        
+        if wb is not None and streaming:
+            # Libera el archivo zip que el modo de solo lectura mantiene abierto
+            wb.close()
+        
+        indice = []
+        huellas_actuales = {}
+        # Las hojas conservadas mantienen su parte del índice de búsqueda anterior
+        busqueda_previa = busqueda_por_hoja(leer_indice_busqueda(carpeta_salida)) if conservadas else {}
+        busqueda_libro = []
+        for sheet_name in seleccionadas:
+            if sheet_name in conservadas:
+                previa = conservadas[sheet_name]
+                indice.append({'nombre': previa['nombre'], 'archivo': previa['archivo']})
+                huellas_actuales[sheet_name] = previa
+                if previa['archivo'] in busqueda_previa:
+                    busqueda_libro.append((previa['archivo'], previa['nombre'], busqueda_previa[previa['archivo']]))
+                continue
             
-            // También se puede agregar para que funcione con la tecla Enter
-            buscadorInput.addEventListener('keypress', function(e) {
-                if (e.key === 'Enter') {
-                    e.preventDefault();
-                    filtrarLibros();
+            nombre_archivo_html = f"{slugify(sheet_name)}.html"
+            titulo, busqueda = renderizadas[sheet_name]
+            indice.append({'nombre': titulo, 'archivo': nombre_archivo_html})
+            busqueda_libro.append((nombre_archivo_html, titulo, busqueda))
+            if sheet_name in huellas:
+                huellas_actuales[sheet_name] = {
+                    'huella': huellas[sheet_name],
+                    'nombre': titulo,
+                    'archivo': nombre_archivo_html
                 }
-            });
-        });
-    </script>
-</body>
-</html>
-"""
-    
-    with open(f"{carpeta_salida}/indice.html", 'w', encoding='utf-8') as f:
-        f.write(html)
\ No newline at end of file
+        
+        if incremental:
+            guardar_huellas(carpeta_salida, huellas_actuales)
+        guardar_indice_busqueda(carpeta_salida, nombre_archivo_excel, busqueda_libro)
+        generar_indice(indice, carpeta_salida, nombre_archivo_excel, carpeta_sitio)
+        instrumentacion.contar('libros')
+        return indice
+
+
+def generar_indice_general(indice, carpeta_salida='html_output'):
+    # Fragmentos del índice de búsqueda de cada libro, con sus prefijos para cargarlos bajo demanda
+    indices_busqueda = []
+    for item in indice:
+        carpeta_libro = os.path.dirname(item['archivo'])
+        datos = leer_indice_busqueda(os.path.join(carpeta_salida, carpeta_libro))
+        if datos is not None:
+            indices_busqueda.append({
+                'libro': datos['libro'],
+                'archivo': f"{carpeta_libro}/{ARCHIVO_BUSQUEDA}",
+                'base': f"{carpeta_libro}/",
+                'prefijos': datos['prefijos']
+            })
+    guardar_buscador(carpeta_salida)
+    salida.escribir(f"{carpeta_salida}/indice.html", iterar_html_indice_general(indice, indices_busqueda))
+
+def iterar_html_indice_general(indice, indices_busqueda=None):
+    """
+    Genera por fragmentos de bytes el HTML del índice general de libros. indices_busqueda es
+    la lista de fragmentos de índice de búsqueda de los libros (ver generar_indice_general).
+    """
+    yield plantillas.INICIO_INDICE_GENERAL.render()
+    for item in indice:
+        yield plantillas.ELEMENTO_INDICE_GENERAL.render(archivo=item['archivo'], nombre=item['nombre'])
+    yield plantillas.FIN_INDICE_GENERAL.render(
+        buscador=ARCHIVO_BUSCADOR,
+        config_buscador=config_buscador(indices_busqueda or [], True)
+    )
@@ -1,3 +1,5 @@
+import salida
+
 css = """/* Estilos generales */
 body {
     font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -146,6 +148,38 @@ tr:hover {
     box-shadow: 0 2px 8px rgba(0,0,0,0.05);
 }
 
+/* Navegación entre páginas de tablas grandes */
+.paginacion {
+    display: flex;
+    flex-wrap: wrap;
+    align-items: center;
+    gap: 6px;
+    margin: 20px 0 0;
+}
+
+.paginacion a,
+.paginacion .pagina-actual {
+    padding: 4px 10px;
+    border-radius: 4px;
+    border: 1px solid #28367f;
+    text-decoration: none;
+    color: #28367f;
+}
+
+.paginacion a:hover {
+    background-color: #e8f4fc;
+}
+
+.paginacion .pagina-actual {
+    background-color: #28367f;
+    color: white;
+}
+
+.paginacion-estado {
+    margin-right: 10px;
+    font-weight: 600;
+}
+
 /* Estilo para celdas especiales */
 td.destacado {
     background-color: #e3f2fd;
@@ -312,7 +346,6 @@ footer {
 
 """
 def crear_css():
-    with open('html_output/css/styles.css', 'w', encoding='utf-8') as file:
-        file.write(css)
+    salida.escribir('html_output/css/styles.css', css.encode('utf-8'))
     print("Archivo CSS creado exitosamente en 'css/estilos.css'")
 
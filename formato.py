@@ -1,56 +1,94 @@
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+import instrumentacion
+import salida
 
-def convert_second_row_to_subheader(html_file):
-    with open(html_file, 'r', encoding='utf-8') as file:
-        html_content = file.read()
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
+# Backend usado por defecto para leer y reescribir los HTML
+DEFAULT_BACKEND = 'lxml'
+
+# XPath equivalente a class_='...' de BeautifulSoup (coincide con una de las clases)
+def _xpath_class(tag, class_name):
+    return f'{tag}[contains(concat(" ", normalize-space(@class), " "), " {class_name} ")]'
+
+def _parse(html_content, backend):
+    if backend == 'lxml':
+        return lxml.html.document_fromstring(html_content)
+    return BeautifulSoup(html_content, 'html.parser')
+
+def _serialize(doc, backend):
+    if backend == 'lxml':
+        return etree.tostring(doc.getroottree(), method='html', encoding='unicode')
+    return str(doc)
+
+def _subheader_bs4(soup, html_file):
     # Seleccionar la tabla según el archivo
     if 'calidad.html' in html_file:
         # Obtener todas las tablas y seleccionar la segunda
         tables = soup.find_all('table', class_='tabla-estructurada')
         if len(tables) < 2:
             print(f"No hay suficientes tablas en {html_file}")
-            return
+            return False
         table = tables[1]  # Segunda tabla (índice 1)
     else:
         # Para otros archivos, usar la primera tabla
         table = soup.find('table', class_='tabla-estructurada')
-    
+
     if not table:
         print(f"No se encontró la tabla en {html_file}")
-        return
-    
+        return False
+
     thead = table.find('thead')
     tbody = table.find('tbody')
-    
+
     if not tbody or len(tbody.find_all('tr')) < 2:
         print(f"No hay suficientes filas en el tbody de {html_file}")
-        return
-    
+        return False
+
     # Obtener la segunda fila y agregar clase CSS
     second_row = tbody.find_all('tr')[0]
     second_row['class'] = 'subheader'  # Agregamos esta línea
-    
+
     # Mover la fila al thead
     second_row.extract()
     thead.append(second_row)
-    
-    with open(html_file, 'w', encoding='utf-8') as file:
-        file.write(str(soup))
-    print(f"Archivo {html_file} modificado exitosamente")
-
-def delete_fuenteoficial(html_file):
-    with open(html_file, 'r', encoding='utf-8') as file:
-        html_content = file.read()
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
+    return True
+
+def _subheader_lxml(doc, html_file):
+    tables = doc.xpath('//' + _xpath_class('table', 'tabla-estructurada'))
+    # Seleccionar la tabla según el archivo
+    if 'calidad.html' in html_file:
+        if len(tables) < 2:
+            print(f"No hay suficientes tablas en {html_file}")
+            return False
+        table = tables[1]  # Segunda tabla (índice 1)
+    else:
+        table = tables[0] if tables else None
+
+    if table is None:
+        print(f"No se encontró la tabla en {html_file}")
+        return False
+
+    thead = table.find('.//thead')
+    tbody = table.find('.//tbody')
+
+    if tbody is None or len(tbody.findall('.//tr')) < 2:
+        print(f"No hay suficientes filas en el tbody de {html_file}")
+        return False
+
+    # Mover la primera fila del tbody al thead como subencabezado
+    second_row = tbody.findall('.//tr')[0]
+    second_row.set('class', 'subheader')
+    second_row.getparent().remove(second_row)
+    thead.append(second_row)
+    return True
+
+def _fuenteoficial_bs4(soup, html_file):
     table = soup.find('table', class_='tabla-estructurada')
     if not table:
         print(f"No se encontró la tabla en {html_file}")
-        return
-    
+        return False
+
     thead = table.find('thead')
     tbody = table.find('tbody')
 
@@ -58,7 +96,7 @@ def delete_fuenteoficial(html_file):
     subheader_row = thead.find('tr', class_='subheader')
     if not subheader_row:
         print(f"No se encontró la fila subheader en {html_file}")
-        return
+        return False
 
     # Identificar los índices de las columnas que contienen "(Fuente Oficial)"
     cols_to_delete = []
@@ -68,7 +106,7 @@ def delete_fuenteoficial(html_file):
 
     if not cols_to_delete:
         print(f"No se encontraron columnas '(Fuente Oficial)' en {html_file}")
-        return
+        return False
 
     # Eliminar las columnas en todas las filas de thead y tbody
     for section in [thead, tbody]:
@@ -77,9 +115,87 @@ def delete_fuenteoficial(html_file):
             for i in sorted(cols_to_delete, reverse=True):
                 if i < len(cells):
                     cells[i].extract()
+    return True
+
+def _fuenteoficial_lxml(doc, html_file):
+    tables = doc.xpath('//' + _xpath_class('table', 'tabla-estructurada'))
+    if not tables:
+        print(f"No se encontró la tabla en {html_file}")
+        return False
+
+    thead = tables[0].find('.//thead')
+    tbody = tables[0].find('.//tbody')
+
+    # Buscar la fila subheader en thead
+    subheader_rows = thead.xpath('.//' + _xpath_class('tr', 'subheader')) if thead is not None else []
+    if not subheader_rows:
+        print(f"No se encontró la fila subheader en {html_file}")
+        return False
+
+    # Identificar los índices de las columnas que contienen "(Fuente Oficial)"
+    cols_to_delete = []
+    for idx, th in enumerate(subheader_rows[0].xpath('.//th|.//td')):
+        if '(Fuente Oficial)' in th.text_content():
+            cols_to_delete.append(idx)
+
+    if not cols_to_delete:
+        print(f"No se encontraron columnas '(Fuente Oficial)' en {html_file}")
+        return False
+
+    # Eliminar las columnas en todas las filas de thead y tbody
+    for section in [thead, tbody]:
+        if section is None:
+            continue
+        for row in section.iter('tr'):
+            cells = row.xpath('.//th|.//td')
+            for i in sorted(cols_to_delete, reverse=True):
+                if i < len(cells):
+                    cells[i].drop_tree()
+    return True
+
+def _run(html_file, transforms, backend):
+    """Lee, parsea y serializa el archivo una sola vez aplicando todas las transformaciones."""
+    with instrumentacion.tramo('formato', archivo=html_file, backend=backend):
+        with open(html_file, 'r', encoding='utf-8') as file:
+            html_content = file.read()
+
+        with instrumentacion.tramo('formato.parsear', archivo=html_file):
+            doc = _parse(html_content, backend)
+        modified = False
+        with instrumentacion.tramo('formato.transformar', archivo=html_file):
+            for transform in transforms:
+                modified = _IMPLEMENTATIONS[transform][backend](doc, html_file) or modified
+
+        if modified:
+            with instrumentacion.tramo('formato.serializar', archivo=html_file):
+                html_content = _serialize(doc, backend)
+            # Atomic replace; skipped if the serialized page is byte-identical
+            salida.escribir(html_file, html_content.encode('utf-8'))
+    return modified
+
+def convert_second_row_to_subheader(html_file, backend=DEFAULT_BACKEND):
+    if _run(html_file, [convert_second_row_to_subheader], backend):
+        print(f"Archivo {html_file} modificado exitosamente")
+
+def delete_fuenteoficial(html_file, backend=DEFAULT_BACKEND):
+    if _run(html_file, [delete_fuenteoficial], backend):
+        print(f"Columnas '(Fuente Oficial)' eliminadas en {html_file}")
+
+def apply_transforms(html_files, transforms, backend=DEFAULT_BACKEND):
+    """
+    Aplica en lote una lista de transformaciones (las funciones de este módulo) a una lista
+    de archivos, con un único parseo y una única escritura por archivo.
+    Devuelve la lista de archivos modificados.
+    """
+    modified_files = []
+    for html_file in html_files:
+        if _run(html_file, transforms, backend):
+            print(f"Archivo {html_file} modificado exitosamente")
+            modified_files.append(html_file)
+    return modified_files
 
-    with open(html_file, 'w', encoding='utf-8') as file:
-        file.write(str(soup))
-    print(f"Columnas '(Fuente Oficial)' eliminadas en {html_file}")
-    
-    
+# Implementación de cada transformación por backend
+_IMPLEMENTATIONS = {
+    convert_second_row_to_subheader: {'bs4': _subheader_bs4, 'lxml': _subheader_lxml},
+    delete_fuenteoficial: {'bs4': _fuenteoficial_bs4, 'lxml': _fuenteoficial_lxml},
+}
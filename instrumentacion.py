@@ -0,0 +1,177 @@
+## Instrumentación de la conversión: tramos con duración y contadores
+##
+## Desactivada por defecto; activar() o la variable de entorno CONVERTHTML_INSTRUMENTACION=1
+## la encienden. Con la instrumentación apagada, tramo() devuelve siempre el mismo contexto
+## vacío y contar() retorna de inmediato, así que el coste es una comprobación por llamada.
+##
+## Uso:
+##   import instrumentacion
+##   instrumentacion.activar()
+##   procesar_todos_los_excel()
+##   instrumentacion.exportar_informe('informe.json')
+##   instrumentacion.exportar_traza_chrome('traza.json')  # abrir en chrome://tracing o Perfetto
+
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import salida
+
+_activa = os.getenv("CONVERTHTML_INSTRUMENTACION", "") not in ("", "0")
+_tramos = []
+_contadores = {}
+_lock = threading.Lock()
+_inicio_ejecucion = datetime.now()
+_TRAMO_NULO = contextlib.nullcontext()
+
+def activar():
+    """Enciende la instrumentación y descarta lo registrado hasta ahora."""
+    global _activa, _inicio_ejecucion
+    reiniciar()
+    _inicio_ejecucion = datetime.now()
+    _activa = True
+
+def desactivar():
+    global _activa
+    _activa = False
+
+def activa():
+    return _activa
+
+def reiniciar():
+    with _lock:
+        _tramos.clear()
+        _contadores.clear()
+
+class _Tramo:
+    __slots__ = ('nombre', 'atributos', 'inicio')
+
+    def __init__(self, nombre, atributos):
+        self.nombre = nombre
+        self.atributos = atributos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        fin = time.perf_counter_ns()
+        registro = (self.nombre, self.inicio // 1000, (fin - self.inicio) // 1000,
+                    os.getpid(), threading.get_ident(), self.atributos)
+        with _lock:
+            _tramos.append(registro)
+        return False
+
+def tramo(nombre, **atributos):
+    """
+    Contexto que mide la duración de una etapa (p. ej. tramo('hoja', hoja='Calidad')).
+    Los atributos se guardan con el tramo y aparecen en el informe y en la traza.
+    """
+    if not _activa:
+        return _TRAMO_NULO
+    return _Tramo(nombre, atributos)
+
+def contar(nombre, cantidad=1):
+    """Suma cantidad al contador nombre (filas, celdas, libros...)."""
+    if not _activa:
+        return
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+def ejecutar_en_proceso(funcion, activa_en_padre, *args, **kwargs):
+    """
+    Ejecuta funcion dentro de un proceso de un pool y devuelve (resultado, registro), donde
+    registro contiene lo escrito durante esa llamada (salida.resumen) y, si la
+    instrumentación está encendida en el proceso principal, sus tramos y contadores.
+    El proceso principal lo añade con incorporar().
+    Solo debe usarse en procesos que ejecutan una tarea cada vez, no en hilos.
+    """
+    global _activa
+    _activa = activa_en_padre
+    reiniciar()
+    salida.reiniciar()
+    try:
+        resultado = funcion(*args, **kwargs)
+    finally:
+        with _lock:
+            registro = {'tramos': list(_tramos), 'contadores': dict(_contadores)} if activa_en_padre else {}
+            _tramos.clear()
+            _contadores.clear()
+        registro['escrito'] = salida.resumen()
+        salida.reiniciar()
+    return resultado, registro
+
+def incorporar(registro):
+    """Añade al proceso actual lo escrito, los tramos y los contadores de ejecutar_en_proceso."""
+    if not registro:
+        return
+    salida.sumar(registro.get('escrito'))
+    if not _activa or 'tramos' not in registro:
+        return
+    with _lock:
+        _tramos.extend(tuple(tramo_hijo) for tramo_hijo in registro['tramos'])
+        for nombre, cantidad in registro['contadores'].items():
+            _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+def informe():
+    """
+    Devuelve el informe de la ejecución: contadores, archivos y bytes escritos de verdad
+    (salida.resumen), resumen por tipo de tramo (número, total, media y máximo en segundos)
+    y la lista de tramos ordenada por inicio.
+    """
+    with _lock:
+        tramos = sorted(_tramos, key=lambda registro: registro[1])
+        contadores = dict(_contadores)
+    resumen = {}
+    for nombre, _, duracion, _, _, _ in tramos:
+        datos = resumen.setdefault(nombre, {'veces': 0, 'segundos': 0.0, 'maximo_segundos': 0.0})
+        datos['veces'] += 1
+        datos['segundos'] += duracion / 1e6
+        datos['maximo_segundos'] = max(datos['maximo_segundos'], duracion / 1e6)
+    for datos in resumen.values():
+        datos['media_segundos'] = round(datos['segundos'] / datos['veces'], 6)
+        datos['segundos'] = round(datos['segundos'], 6)
+        datos['maximo_segundos'] = round(datos['maximo_segundos'], 6)
+    origen = tramos[0][1] if tramos else 0
+    return {
+        'inicio': _inicio_ejecucion.isoformat(timespec='seconds'),
+        'contadores': contadores,
+        'escritura': salida.resumen(),
+        'resumen': resumen,
+        'tramos': [
+            {
+                'nombre': nombre,
+                'inicio_segundos': round((inicio - origen) / 1e6, 6),
+                'segundos': round(duracion / 1e6, 6),
+                'pid': pid,
+                'hilo': hilo,
+                **atributos
+            }
+            for nombre, inicio, duracion, pid, hilo, atributos in tramos
+        ]
+    }
+
+def exportar_informe(ruta):
+    """Guarda informe() como JSON."""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(informe(), f, ensure_ascii=False, indent=2, default=str)
+
+def exportar_traza_chrome(ruta):
+    """
+    Guarda los tramos en el formato Trace Event de Chrome (chrome://tracing, Perfetto).
+    Los contadores se añaden como metadatos de la traza.
+    """
+    with _lock:
+        tramos = list(_tramos)
+        contadores = dict(_contadores)
+    eventos = [
+        {'name': nombre, 'ph': 'X', 'ts': inicio, 'dur': duracion, 'pid': pid, 'tid': hilo,
+         'args': atributos}
+        for nombre, inicio, duracion, pid, hilo, atributos in tramos
+    ]
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': eventos, 'displayTimeUnit': 'ms', 'otherData': contadores},
+                  f, ensure_ascii=False, default=str)
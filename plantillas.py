@@ -0,0 +1,204 @@
+## Plantillas de las páginas generadas (hojas, índice de cada libro e índice general)
+##
+## Cada plantilla se compila una sola vez al importar el módulo: el texto fijo (cabecera,
+## pie con el logo, enlace a Font Awesome, scripts) queda codificado en bytes y en cada
+## página solo se escapan y codifican los campos ($campo o ${campo}; $$ es un $ literal).
+## Las partes comunes a varias páginas (_inicio, _buscador, _pie) se definen aquí una vez.
+##
+## Uso:
+##   with open(ruta, 'wb') as f:
+##       f.write(plantillas.INICIO_HOJA.render(titulo=..., libro=..., hoja=...))
+
+import re
+from html import escape
+
+_CAMPO = re.compile(r'\$(?:(\$)|(\w+)|\{(\w+)\})')
+
+class Plantilla:
+    """
+    Plantilla compilada: el texto fijo queda en un único molde de bytes con un hueco %b
+    por campo, así que cada uso es una sola operación de formato sobre bytes.
+    Los valores de los campos se escapan para HTML salvo los indicados en crudos, que deben
+    ser HTML o JSON ya preparado.
+    """
+
+    def __init__(self, texto, crudos=()):
+        molde = []
+        self.campos = []
+        posicion = 0
+        for coincidencia in _CAMPO.finditer(texto):
+            molde.append(texto[posicion:coincidencia.start()].replace('%', '%%'))
+            posicion = coincidencia.end()
+            if coincidencia.group(1):
+                molde.append('$')
+            else:
+                molde.append('%b')
+                self.campos.append(coincidencia.group(2) or coincidencia.group(3))
+        molde.append(texto[posicion:].replace('%', '%%'))
+        self.molde = ''.join(molde).encode('utf-8')
+        self.crudos = frozenset(crudos)
+        if not self.crudos <= set(self.campos):
+            raise ValueError(f"Campos crudos que no están en la plantilla: {sorted(self.crudos - set(self.campos))}")
+        self._campos = tuple((campo, campo not in self.crudos) for campo in self.campos)
+
+    def render(self, **valores):
+        """Devuelve los bytes de la plantilla con los campos sustituidos."""
+        if not self._campos:
+            return self.molde
+        return self.molde % tuple([
+            escape(str(valores[campo])).encode() if escapar else valores[campo].encode()
+            for campo, escapar in self._campos
+        ])
+
+FONT_AWESOME = ('    <link rel="stylesheet" '
+                'href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.3/css/all.min.css">\n')
+
+LOGO = "Logo secretaria de Gobierno Digital y Tecnología de la Información y Comunicaciones"
+
+def _inicio(raiz, titulo, font_awesome=True):
+    """<head> y apertura de <body>; raiz es la ruta desde la página hasta html_output."""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>{titulo}</title>
+    <link rel="stylesheet" href="{raiz}css/styles.css">
+{FONT_AWESOME if font_awesome else ''}</head>
+<body>
+"""
+
+def _buscador(texto_ayuda):
+    """Caja de búsqueda y lista de resultados del buscador de los índices."""
+    return f"""        <div class="buscador">
+            <input type="text" id="buscador-input" placeholder="{texto_ayuda}">
+        </div>
+        <ul class="lista-indice resultados-busqueda" id="resultados-busqueda" style="display: none"></ul>
+"""
+
+def _pie(raiz):
+    return f"""    <footer>
+        <div class="footer-flex">
+            <img src="{raiz}assets/azul_sdgdtic.png" alt="{LOGO}">
+            <span>&copy; 2025</span>
+        </div>
+    </footer>
+"""
+
+# Carga el buscador ($buscador es la ruta a buscador.js) y lo inicia con su configuración
+_SCRIPTS_BUSCADOR = """    <script src="$buscador"></script>
+    <script>
+        iniciarBuscador($config_buscador);
+    </script>
+"""
+
+_FIN_DOCUMENTO = """</body>
+</html>
+"""
+
+# Página de una hoja (y de cada página numerada de sus tablas grandes)
+INICIO_HOJA = Plantilla(_inicio('../', '$titulo - $libro') + """    <header>
+        <h1>$hoja</h1>
+        <a href="index.html" class="btn-volver"><i class="fas fa-arrow-left"></i> Volver al índice</a>
+    </header>
+    <div class="contenido-hoja">
+""")
+
+FIN_HOJA = Plantilla("""
+    </div>
+""" + _pie('../') + _FIN_DOCUMENTO)
+
+# Índice de un libro
+INICIO_INDICE_LIBRO = Plantilla(_inicio('../', 'Indice - $libro') + """    <header>
+        <h1>$libro</h1>
+        <a href="../indice.html" class="btn-volver"><i class="fas fa-arrow-left"></i> Volver al índice de Libros</a>
+    </header>
+    <div class="contenedor-indice">
+        <h2>Indice de Contenidos</h2>
+""" + _buscador('Buscar hoja, campo o término...') + """        <ul class="lista-indice">
+""")
+
+ELEMENTO_INDICE_LIBRO = Plantilla('<li><a href="$archivo"><i class="fas fa-file-alt"></i> $nombre</a></li>\n')
+
+FIN_INDICE_LIBRO = Plantilla("""        </ul>
+    </div>
+""" + _pie('../') + _SCRIPTS_BUSCADOR + _FIN_DOCUMENTO, crudos=('config_buscador',))
+
+# Índice general de libros
+INICIO_INDICE_GENERAL = Plantilla(_inicio('', 'Libros de Dominios', font_awesome=False) + """    <header>
+        <h1>Libros de Dominios</h1>
+    </header>
+
+    <div class="contenedor-indice">
+        <h2>Índice de Contenidos</h2>
+
+""" + _buscador('Buscar libro, hoja o campo...') + """
+        <ul class="lista-indice" id="lista-libros">
+""")
+
+ELEMENTO_INDICE_GENERAL = Plantilla('<li><a href="$archivo">$nombre</a></li>\n')
+
+# Filtro de la lista de libros por nombre
+_SCRIPT_FILTRO_LIBROS = """    <script>
+        document.addEventListener('DOMContentLoaded', function() {
+            const buscadorInput = document.getElementById('buscador-input');
+            const lista = document.getElementById('lista-libros');
+            const items = lista.getElementsByTagName('li');
+            const sinResultados = document.getElementById('sin-resultados');
+            const resultadosBusqueda = document.getElementById('resultados-busqueda');
+            let librosVisibles = items.length;
+
+            // El mensaje solo se muestra si tampoco hay resultados de la búsqueda en el contenido
+            function actualizarMensaje() {
+                const hayResultados = resultadosBusqueda.children.length > 0 &&
+                    resultadosBusqueda.style.display !== "none";
+                sinResultados.style.display = librosVisibles === 0 && !hayResultados ? "block" : "none";
+            }
+
+            // Función para filtrar los libros
+            function filtrarLibros() {
+                const texto = buscadorInput.value.toLowerCase();
+                let resultados = 0;
+
+                // Recorrer todos los elementos de la lista
+                for (let i = 0; i < items.length; i++) {
+                    const textoItem = items[i].textContent || items[i].innerText;
+
+                    // Mostrar u ocultar elementos según coincidan con la búsqueda
+                    if (textoItem.toLowerCase().indexOf(texto) > -1) {
+                        items[i].style.display = "";
+                        resultados++;
+                    } else {
+                        items[i].style.display = "none";
+                    }
+                }
+
+                // El mensaje se decide cuando llegan los resultados de la búsqueda (actualizarMensaje)
+                librosVisibles = resultados;
+                if (resultados > 0) {
+                    sinResultados.style.display = "none";
+                }
+            }
+
+            // Escuchar el evento de entrada en el buscador
+            buscadorInput.addEventListener('input', filtrarLibros);
+            // Los resultados de la búsqueda en el contenido llegan después (ver buscador.js)
+            resultadosBusqueda.addEventListener('actualizada', actualizarMensaje);
+
+            // También se puede agregar para que funcione con la tecla Enter
+            buscadorInput.addEventListener('keypress', function(e) {
+                if (e.key === 'Enter') {
+                    e.preventDefault();
+                    filtrarLibros();
+                }
+            });
+        });
+    </script>
+"""
+
+FIN_INDICE_GENERAL = Plantilla("""        </ul>
+        <div class="sin-resultados" id="sin-resultados">
+            No se encontraron libros que coincidan con la búsqueda.
+        </div>
+    </div>
+
+""" + _pie('') + _SCRIPT_FILTRO_LIBROS + _SCRIPTS_BUSCADOR + _FIN_DOCUMENTO, crudos=('config_buscador',))
@@ -0,0 +1,136 @@
+## Escritura de los archivos generados: atómica y sin reescribir los que no cambian
+##
+## escribir(ruta, contenido) compara el contenido nuevo con el archivo existente a medida
+## que se genera. Si es idéntico el archivo no se toca, así que conserva su fecha de
+## modificación y rsync o la caché de una CDN no lo ven como cambiado. Si difiere, se escribe
+## en un temporal de la misma carpeta que después reemplaza al archivo con os.replace: una
+## ejecución interrumpida nunca deja una página a medio escribir.
+##
+## resumen() devuelve cuántos archivos y bytes se escribieron de verdad. Los procesos de un
+## pool lo devuelven y el proceso principal lo suma con instrumentacion.ejecutar_en_proceso()
+## e instrumentacion.incorporar().
+
+import os
+import tempfile
+import threading
+
+TAMANO_BLOQUE = 1 << 16
+
+_lock = threading.Lock()
+_resumen = {'archivos_cambiados': 0, 'bytes_cambiados': 0, 'archivos_sin_cambios': 0}
+
+# Permisos de los archivos nuevos: los mismos que les daría open() con la umask del proceso
+_umask = os.umask(0)
+os.umask(_umask)
+PERMISOS_NUEVOS = 0o666 & ~_umask
+
+def _sumar(cambiado, cantidad_bytes=0):
+    with _lock:
+        if cambiado:
+            _resumen['archivos_cambiados'] += 1
+            _resumen['bytes_cambiados'] += cantidad_bytes
+        else:
+            _resumen['archivos_sin_cambios'] += 1
+
+def _copiar_inicio(origen, destino, cantidad):
+    """Copia los primeros cantidad bytes de origen en destino."""
+    origen.seek(0)
+    while cantidad > 0:
+        bloque = origen.read(min(cantidad, TAMANO_BLOQUE))
+        if not bloque:
+            break
+        destino.write(bloque)
+        cantidad -= len(bloque)
+
+def escribir(ruta, contenido):
+    """
+    Escribe contenido (bytes o un iterable de fragmentos de bytes) en ruta, salvo que el
+    archivo ya tenga exactamente ese contenido. Devuelve True si el archivo cambió.
+    Mientras el contenido coincide con el del archivo existente no se escribe nada; al
+    primer fragmento distinto se pasa a un temporal que reemplaza al archivo al terminar.
+    """
+    if isinstance(contenido, (bytes, bytearray)):
+        contenido = (contenido,)
+    try:
+        actual = open(ruta, 'rb')
+    except FileNotFoundError:
+        actual = None
+    temporal = None
+    ruta_temporal = None
+    total = 0
+    try:
+        for fragmento in contenido:
+            if temporal is None:
+                if actual is not None and actual.read(len(fragmento)) == fragmento:
+                    total += len(fragmento)
+                    continue
+                # Primer fragmento distinto: el temporal empieza con la parte que coincidía
+                temporal, ruta_temporal = _crear_temporal(ruta)
+                if actual is not None:
+                    _copiar_inicio(actual, temporal, total)
+            temporal.write(fragmento)
+            total += len(fragmento)
+        if temporal is None:
+            if actual is not None and not actual.read(1):
+                actual.close()
+                _sumar(False)
+                return False
+            # El archivo existente es más largo (o no existe): se escribe igualmente
+            temporal, ruta_temporal = _crear_temporal(ruta)
+            if actual is not None:
+                _copiar_inicio(actual, temporal, total)
+        permisos = PERMISOS_NUEVOS
+        if actual is not None:
+            permisos = os.fstat(actual.fileno()).st_mode & 0o7777
+            # En Windows no se puede reemplazar un archivo abierto
+            actual.close()
+        temporal.close()
+        os.chmod(ruta_temporal, permisos)
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if temporal is not None:
+            temporal.close()
+            os.remove(ruta_temporal)
+        raise
+    finally:
+        if actual is not None:
+            actual.close()
+    _sumar(True, total)
+    return True
+
+def _crear_temporal(ruta):
+    descriptor, ruta_temporal = tempfile.mkstemp(
+        prefix=f".{os.path.basename(ruta)}.", suffix='.tmp', dir=os.path.dirname(ruta) or '.'
+    )
+    return os.fdopen(descriptor, 'wb'), ruta_temporal
+
+def leer_en_bloques(ruta):
+    """Genera el contenido del archivo ruta en bloques de TAMANO_BLOQUE bytes."""
+    with open(ruta, 'rb') as f:
+        while True:
+            bloque = f.read(TAMANO_BLOQUE)
+            if not bloque:
+                return
+            yield bloque
+
+def copiar(origen, destino):
+    """Copia el archivo origen en destino con escribir(); devuelve True si destino cambió."""
+    return escribir(destino, leer_en_bloques(origen))
+
+def reiniciar():
+    with _lock:
+        for clave in _resumen:
+            _resumen[clave] = 0
+
+def resumen():
+    """Devuelve {'archivos_cambiados', 'bytes_cambiados', 'archivos_sin_cambios'}."""
+    with _lock:
+        return dict(_resumen)
+
+def sumar(escrito):
+    """Suma al proceso actual un resumen devuelto por resumen() en otro proceso."""
+    if not escrito:
+        return
+    with _lock:
+        for clave, cantidad in escrito.items():
+            _resumen[clave] = _resumen.get(clave, 0) + cantidad